@@ -0,0 +1,157 @@
+"""
+Admission control for Legal Document AI Simplifier
+Caps concurrent requests and estimated prompt tokens in flight, globally and
+per client, so that expensive routes shed load immediately instead of queuing.
+Admitted requests are held as tickets in a small SQLite table shared by every
+server process, so the limits hold across preforked workers rather than per
+worker, and /health reports the same load whichever worker answers.
+"""
+
+import os
+import math
+import sqlite3
+import threading
+from contextlib import closing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    client TEXT,
+    cost INTEGER NOT NULL
+)
+"""
+
+
+class Ticket:
+    """Admission granted to one request; hand it back to release()"""
+
+    def __init__(self, ticket_id, client, cost):
+        self.id = ticket_id
+        self.client = client
+        self.cost = cost
+
+
+def connect(path):
+    """Open the ticket table, creating it on first use"""
+    # Autocommit, so each statement outside BEGIN is its own transaction
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    # Tickets only matter while the server runs, so they need not survive a power loss
+    connection.execute('PRAGMA synchronous=OFF')
+    connection.execute(SCHEMA)
+    return connection
+
+
+def process_alive(pid):
+    """Whether a process with this pid still exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AdmissionController:
+    """Concurrency and token-cost limits with a service-time estimate for Retry-After"""
+
+    def __init__(self, path, max_concurrent, max_concurrent_per_client, max_tokens, max_tokens_per_client):
+        self.path = path
+        self.max_concurrent = max_concurrent
+        self.max_concurrent_per_client = max_concurrent_per_client
+        self.max_tokens = max_tokens
+        self.max_tokens_per_client = max_tokens_per_client
+        # Decision counters and the service time are this process's own
+        self.admitted = 0
+        self.rejected = 0
+        self.service_time = 1.0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # Created before the workers fork, so tickets from an earlier run of the server are dropped;
+        # the connection is closed again so no worker inherits it
+        with closing(connect(path)) as connection:
+            connection.execute('DELETE FROM tickets')
+
+    def connection(self):
+        """This thread's connection to the ticket table, reopened after a fork"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = connect(self.path)
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def try_acquire(self, client, cost):
+        """Admit a request if every limit has room, otherwise return None"""
+        # A request bigger than a whole budget is still admitted when the server is idle
+        cost = min(cost, self.max_tokens_per_client, self.max_tokens)
+        connection = self.connection()
+        # IMMEDIATE takes the write lock up front, so checking and inserting is atomic across processes
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.prune(connection)
+            in_flight, tokens = connection.execute('SELECT COUNT(*), COALESCE(SUM(cost), 0) FROM tickets').fetchone()
+            client_in_flight, client_tokens = connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(cost), 0) FROM tickets WHERE client = ?', (client,)).fetchone()
+            if (in_flight >= self.max_concurrent
+                    or tokens + cost > self.max_tokens
+                    or client_in_flight >= self.max_concurrent_per_client
+                    or client_tokens + cost > self.max_tokens_per_client):
+                connection.execute('ROLLBACK')
+                with self.lock:
+                    self.rejected += 1
+                return None
+            ticket_id = connection.execute('INSERT INTO tickets (pid, client, cost) VALUES (?, ?, ?)',
+                                           (os.getpid(), client, cost)).lastrowid
+            connection.execute('COMMIT')
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+        with self.lock:
+            self.admitted += 1
+        return Ticket(ticket_id, client, cost)
+
+    def prune(self, connection):
+        """Drop tickets held by workers that died, e.g. killed by the server timeout, mid-request"""
+        for (pid,) in connection.execute('SELECT DISTINCT pid FROM tickets').fetchall():
+            if not process_alive(pid):
+                connection.execute('DELETE FROM tickets WHERE pid = ?', (pid,))
+
+    def release(self, ticket, duration):
+        """Return a ticket's capacity and fold its duration into the service-time estimate"""
+        self.connection().execute('DELETE FROM tickets WHERE id = ?', (ticket.id,))
+        with self.lock:
+            self.service_time = 0.8 * self.service_time + 0.2 * duration
+
+    def retry_after(self):
+        """Whole seconds a rejected client should wait, from the typical service time"""
+        with self.lock:
+            return max(1, math.ceil(self.service_time))
+
+    def load(self):
+        """Requests, estimated tokens and distinct clients in flight across all processes"""
+        return self.connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(cost), 0), COUNT(DISTINCT client) FROM tickets').fetchone()
+
+    def is_ready(self):
+        """Whether a new request from an idle client would be admitted"""
+        in_flight, tokens, _ = self.load()
+        return in_flight < self.max_concurrent and tokens < self.max_tokens
+
+    def snapshot(self):
+        """Current load and counters for the health endpoint"""
+        in_flight, tokens, clients = self.load()
+        with self.lock:
+            return {
+                'in_flight': in_flight,
+                'max_concurrent': self.max_concurrent,
+                'tokens_in_flight': tokens,
+                'max_tokens': self.max_tokens,
+                'clients': clients,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'service_time': round(self.service_time, 3),
+            }
@@ -1,14 +1,38 @@
 import os
+import re
+import gzip
+import io
+import time
+import json
+import queue
+import atexit
+import sqlite3
+import codecs
+import zipfile
+import contextlib
+from functools import lru_cache, partial, wraps
+from concurrent.futures import ThreadPoolExecutor
 import PyPDF2
 import docx
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory, has_request_context
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import openai
-from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import HumanMessage, SystemMessage
 from config import get_config
+from document_store import DocumentStore
+from model_router import ModelRouter
+from admission import AdmissionController
+from ledger import UsageLedger, PUBLIC_GROUP_COLUMNS, report as usage_report
+from llm_clients import ClientPool
+from traffic import TrafficRecorder, UPLOAD_TYPES_KEY
+from memory_profile import StageProfiler
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Load environment variables
 load_dotenv()
@@ -19,96 +43,386 @@ config = get_config()
 app = Flask(__name__)
 app.config.from_object(config)
 
+# Route, payload sizes and timing of every request, for replay.py
+if app.config['TRAFFIC_RECORDING']:
+    app.wsgi_app = TrafficRecorder(app.wsgi_app, app.config['TRAFFIC_LOG_PATH'])
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Extracted text is paged out to disk and served by /documents/<id>/text
+document_store = DocumentStore(
+    app.config['DOCUMENT_STORE_FOLDER'],
+    page_size=app.config['ORIGINAL_TEXT_PAGE_SIZE'],
+    ttl=app.config['DOCUMENT_TTL'],
+    max_bytes=app.config['DOCUMENT_STORE_MAX_BYTES']
+)
+extraction_executor = ThreadPoolExecutor(max_workers=app.config['BACKGROUND_EXTRACTION_WORKERS'])
+
+# Peak allocation of each upload stage, when UPLOAD_PROFILING is on
+upload_profiler = StageProfiler(app.config['UPLOAD_MEMORY_BUDGET'], enabled=app.config['UPLOAD_PROFILING'])
+
+# Batch uploads extract files in parallel; their AI stages share one process-wide pool
+batch_executor = ThreadPoolExecutor(max_workers=app.config['BATCH_EXTRACTION_WORKERS'])
+ai_executor = ThreadPoolExecutor(max_workers=app.config['AI_CONCURRENCY'])
+
+# Sheds load on the expensive routes before it queues up
+admission = AdmissionController(
+    app.config['ADMISSION_STATE_PATH'],
+    max_concurrent=app.config['ADMISSION_MAX_CONCURRENT'],
+    max_concurrent_per_client=app.config['ADMISSION_MAX_CONCURRENT_PER_CLIENT'],
+    max_tokens=app.config['ADMISSION_MAX_TOKENS'],
+    max_tokens_per_client=app.config['ADMISSION_MAX_TOKENS_PER_CLIENT']
+)
+
 # OpenAI configuration
 openai.api_key = app.config['OPENAI_API_KEY']
-llm = ChatOpenAI(
-    model=app.config['OPENAI_MODEL'],
-    temperature=app.config['OPENAI_TEMPERATURE'],
-    api_key=app.config['OPENAI_API_KEY']
+# Token usage, spend and latency of every LLM call, written off the request path
+usage_ledger = UsageLedger(
+    app.config['USAGE_LEDGER_PATH'],
+    pricing=app.config['MODEL_PRICING'],
+    batch_size=app.config['USAGE_LEDGER_BATCH_SIZE'],
+    flush_interval=app.config['USAGE_LEDGER_FLUSH_INTERVAL']
 )
 
+def flush_usage_ledger():
+    """Write queued usage entries before the process exits, e.g. when a recycled worker shuts down"""
+    if not usage_ledger.flush():
+        app.logger.warning("Usage ledger still had %d entries queued at exit", usage_ledger.pending.unfinished_tasks)
+
+# The writer is a daemon thread, so without this a partial batch would be lost at every exit
+atexit.register(flush_usage_ledger)
+
+def usage_context():
+    """Route and client the current LLM call is made for"""
+    if has_request_context():
+        return {'route': request.path, 'client': request.remote_addr}
+    return {'route': None, 'client': None}
+
+# Keep-alive connections shared by every chat model in the process, Streamlit's included
+client_pool = ClientPool.from_config(config)
+
+# Routes each call to one of the configured OpenAI-compatible backends
+llm = ModelRouter.from_config(config, ledger=usage_ledger, usage_context=usage_context,
+                              http_client=client_pool.client, timeout=client_pool.timeout)
+
+def note_upload_type(extension):
+    """Record the uploaded file's type for the traffic log, so replays upload the same kind of file"""
+    request.environ.setdefault(UPLOAD_TYPES_KEY, []).append(extension)
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
-def extract_text_from_pdf(file_path):
-    """Extract text from PDF file"""
+def upload_name(filename):
+    """Safe stored name and extension of an allowed upload"""
+    # secure_filename drops non-ASCII characters, and with them possibly the dot, so split first
+    stem, extension = filename.rsplit('.', 1)
+    extension = extension.lower()
+    return f"{secure_filename(stem) or 'document'}.{extension}", extension
+
+def resolve_char_budget(max_chars=None, max_tokens=None):
+    """Turn an optional character and/or token budget into a character limit"""
+    budgets = [budget for budget in (max_chars, max_tokens and max_tokens * app.config['CHARS_PER_TOKEN']) if budget]
+    return min(budgets) if budgets else app.config['MAX_EXTRACT_CHARS']
+
+def collect_within_budget(pieces, max_chars, separator=''):
+    """Join text pieces from an iterator, pulling no more than the character budget needs"""
+    parts = []
+    remaining = max_chars
+    for piece in pieces:
+        piece = piece[:remaining]
+        parts.append(piece)
+        remaining -= len(piece) + len(separator)
+        if remaining <= 0:
+            break
+    return separator.join(parts)
+
+# Text extractors by file extension, see register_extractor()
+EXTRACTORS = {}
+
+def register_extractor(extension, label, separator='\n', streaming=False, page_parallel=False, buffer_input=False,
+                       memory_estimate=None):
+    """Register a generator of text pieces as the extractor for a file extension
+
+    Capability flags: streaming extractors read the file incrementally rather than
+    loading it whole, page_parallel ones can extract pages independently of each
+    other, and buffer_input ones accept an in-memory file object as well as a path.
+    Extractors that do not stream can give a memory_estimate callable returning the
+    bytes they will load, which is checked against UPLOAD_MEMORY_BUDGET.
+    """
+    def decorator(iter_pieces):
+        EXTRACTORS[extension] = {
+            'iter_pieces': iter_pieces,
+            'label': label,
+            'separator': separator,
+            'streaming': streaming,
+            'page_parallel': page_parallel,
+            'buffer_input': buffer_input,
+            'memory_estimate': memory_estimate,
+        }
+        return iter_pieces
+    return decorator
+
+def get_extractor(file_extension):
+    """Registered extractor for a file extension"""
+    extractor = EXTRACTORS.get(file_extension.lower())
+    if extractor is None:
+        raise ValueError("Unsupported file format")
+    return extractor
+
+def open_source(source):
+    """Open a file path for binary reading, or pass an in-memory buffer through"""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    return contextlib.nullcontext(source)
+
+@register_extractor('pdf', 'PDF', streaming=True, page_parallel=True, buffer_input=True)
+def iter_pdf_pages(file_path):
+    """Yield the text of each PDF page, parsing pages only as they are requested"""
+    with open_source(file_path) as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for page in pdf_reader.pages:
+            text = page.extract_text()
+            # Drop the parsed objects of pages already read so memory stays flat across long documents
+            pdf_reader.resolved_objects.clear()
+            yield text
+
+def extract_text_from_pdf(file_path, max_chars=None, max_tokens=None):
+    """Extract text from PDF file, stopping at the first page that fills the budget"""
+    return extract_text_from_file(file_path, 'pdf', max_chars, max_tokens)
+
+def docx_body_size(source):
+    """Uncompressed size of a DOCX's body XML, which python-docx parses whole"""
+    if not zipfile.is_zipfile(source):
+        return 0
+    with zipfile.ZipFile(source) as archive:
+        try:
+            return archive.getinfo('word/document.xml').file_size
+        except KeyError:
+            return 0
+
+@register_extractor('docx', 'DOCX', buffer_input=True, memory_estimate=docx_body_size)
+def iter_docx_paragraphs(file_path):
+    """Yield the text of each DOCX paragraph"""
+    doc = docx.Document(file_path)
+    for paragraph in doc.paragraphs:
+        yield paragraph.text
+
+def extract_text_from_docx(file_path, max_chars=None, max_tokens=None):
+    """Extract text from DOCX file, stopping once the budget is filled"""
+    return extract_text_from_file(file_path, 'docx', max_chars, max_tokens)
+
+# Byte order marks, longest first so UTF-32 is not mistaken for UTF-16
+TEXT_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+WHITESPACE_RUN = re.compile(r'\s+')
+
+def detect_text_encoding(file_path, sample_size=None):
+    """Guess the encoding of a text file from a sampled prefix"""
+    sample_size = sample_size or app.config['TXT_ENCODING_SAMPLE_SIZE']
+    with open(file_path, 'rb') as file:
+        sample = file.read(sample_size)
+    
+    for bom, encoding in TEXT_BOMS:
+        if sample.startswith(bom):
+            return encoding
+    
     try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text.strip()
-    except Exception as e:
-        raise ValueError(f"Error reading PDF: {str(e)}")
+        # Non-final decode so a multi-byte character cut by the sample boundary is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        # Windows exports are the usual source of non-UTF-8 uploads
+        return 'cp1252'
+
+def collapse_whitespace(match):
+    """Replace a whitespace run with a paragraph break, line break or single space"""
+    run = match.group()
+    if run == ' ':
+        return run
+    newlines = run.count('\n')
+    if newlines >= 2:
+        return '\n\n'
+    return '\n' if newlines else ' '
 
-def extract_text_from_docx(file_path):
-    """Extract text from DOCX file"""
+def normalize_text_chunks(chunks):
+    """Normalize whitespace across a stream of text chunks in a single pass"""
+    pending = ''
+    at_start = True
+    for chunk in chunks:
+        # Hold back trailing whitespace so a run split across chunks is collapsed as one
+        chunk = pending + chunk
+        body = chunk.rstrip()
+        pending = chunk[len(body):]
+        if not body:
+            continue
+        if at_start:
+            body = body.lstrip()
+            at_start = False
+        yield WHITESPACE_RUN.sub(collapse_whitespace, body)
+
+@register_extractor('txt', 'TXT', separator='', streaming=True)
+def iter_txt_chunks(file_path):
+    """Yield whitespace-normalized chunks of a text file, decoded incrementally"""
+    encoding = detect_text_encoding(file_path)
+    chunk_size = app.config['TXT_READ_CHUNK_SIZE']
+    with open(file_path, 'r', encoding=encoding, errors='replace') as file:
+        chunks = iter(lambda: file.read(chunk_size), '')
+        yield from normalize_text_chunks(chunks)
+
+def extract_text_from_txt(file_path, max_chars=None, max_tokens=None):
+    """Extract text from TXT file, streaming until the character or token budget is filled"""
+    return extract_text_from_file(file_path, 'txt', max_chars, max_tokens)
+
+def check_memory_budget(extractor, source):
+    """Refuse a file whose extractor would load more than UPLOAD_MEMORY_BUDGET into memory"""
+    if extractor['memory_estimate'] is None:
+        return
+    needed = extractor['memory_estimate'](source)
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    if needed > app.config['UPLOAD_MEMORY_BUDGET']:
+        raise ValueError(f"{extractor['label']} file is too large to process: it expands to "
+                         f"{needed // (1024 * 1024)}MB, over the {app.config['UPLOAD_MEMORY_BUDGET'] // (1024 * 1024)}MB limit")
+
+def extract_text_from_file(file_path, file_extension, max_chars=None, max_tokens=None):
+    """Extract text based on file extension, stopping once the character or token budget is filled"""
+    extractor = get_extractor(file_extension)
+    check_memory_budget(extractor, file_path)
     try:
-        doc = docx.Document(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
+        pieces = extractor['iter_pieces'](file_path)
+        try:
+            text = collect_within_budget(pieces, resolve_char_budget(max_chars, max_tokens), extractor['separator'])
+        finally:
+            pieces.close()
         return text.strip()
     except Exception as e:
-        raise ValueError(f"Error reading DOCX: {str(e)}")
+        raise ValueError(f"Error reading {extractor['label']}: {str(e)}")
 
-def extract_text_from_txt(file_path):
-    """Extract text from TXT file"""
+def iter_document_text(file_path, file_extension):
+    """Yield a document's text piece by piece so it can be streamed into the document store"""
+    extractor = get_extractor(file_extension)
+    check_memory_budget(extractor, file_path)
+    pieces = extractor['iter_pieces'](file_path)
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read().strip()
+        for piece in pieces:
+            yield piece + extractor['separator']
     except Exception as e:
-        raise ValueError(f"Error reading TXT: {str(e)}")
-
-def extract_text_from_file(file_path, file_extension):
-    """Extract text based on file extension"""
-    if file_extension.lower() == 'pdf':
-        return extract_text_from_pdf(file_path)
-    elif file_extension.lower() == 'docx':
-        return extract_text_from_docx(file_path)
-    elif file_extension.lower() == 'txt':
-        return extract_text_from_txt(file_path)
-    else:
-        raise ValueError("Unsupported file format")
+        raise ValueError(f"Error reading {extractor['label']}: {str(e)}")
+    finally:
+        pieces.close()
+
+def fill_document_prefix(writer, pieces, budget):
+    """Store pieces until the budget is filled and return that prefix for the AI stage"""
+    parts = []
+    collected = 0
+    for piece in pieces:
+        writer.write(piece)
+        parts.append(piece)
+        collected += len(piece)
+        if collected >= budget:
+            break
+    # Only the last piece can overshoot, so trim it rather than copying the joined text again
+    if collected > budget:
+        parts[-1] = parts[-1][:len(parts[-1]) - (collected - budget)]
+    return ''.join(parts).strip()
+
+def finish_document(writer, pieces, file_path=None):
+    """Drain the rest of a document into the store, then delete the uploaded file if there is one"""
+    failed = False
+    try:
+        with upload_profiler.stage('store'):
+            for piece in pieces:
+                if not writer.write(piece):
+                    break
+    except Exception:
+        failed = True
+        app.logger.exception("Background extraction failed for document %s", writer.document_id)
+    finally:
+        pieces.close()
+        if file_path is not None:
+            os.remove(file_path)
+    # A failed drain is marked so readers do not take the partial text for the whole document
+    try:
+        writer.close(failed=failed)
+    except OSError:
+        # The store purged the document while it was still being drained
+        app.logger.warning("Document %s was removed before extraction finished", writer.document_id)
+
+def start_extraction(writer, source, file_extension):
+    """Extract the prefix the AI stage needs and leave the rest to a background thread"""
+    file_path = None if isinstance(source, io.IOBase) else source
+    pieces = iter_document_text(source, file_extension)
+    try:
+        with upload_profiler.stage('extract'):
+            extracted_text = fill_document_prefix(writer, pieces, ai_extraction_budget())
+    except Exception:
+        pieces.close()
+        if file_path is not None:
+            os.remove(file_path)
+        document_store.discard(writer.document_id)
+        raise
+    extraction_executor.submit(finish_document, writer, pieces, file_path)
+    return extracted_text
+
+def stage_upload(file, writer, file_extension):
+    """Keep a small upload in memory if its extractor reads buffers, otherwise save it to disk"""
+    if get_extractor(file_extension)['buffer_input']:
+        data = file.stream.read(app.config['BATCH_BUFFER_MAX_BYTES'] + 1)
+        if len(data) <= app.config['BATCH_BUFFER_MAX_BYTES']:
+            return io.BytesIO(data)
+        file.stream.seek(0)
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{writer.document_id}_{writer.filename}")
+    file.save(file_path)
+    return file_path
+
+def ai_extraction_budget():
+    """Characters the AI stage will read from a document, plus the chunking window"""
+    return max(app.config['MAX_TEXT_LENGTH'], app.config['MAX_SUMMARY_LENGTH']) + app.config['EXTRACTION_WINDOW']
 
 def simplify_legal_text(text):
     """Use AI to simplify legal text"""
     try:
         system_prompt = app.config['SIMPLIFICATION_PROMPT']
         
-        human_prompt = f"Please simplify this legal text:\n\n{text[:4000]}"  # Limit text length
+        human_prompt = f"Please simplify this legal text:\n\n{text[:app.config['MAX_TEXT_LENGTH']]}"  # Limit text length
         
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=human_prompt)
         ]
         
-        response = llm.invoke(messages)
+        response = llm.invoke(messages, task='simplify')
         return response.content
     except Exception as e:
         return f"Error processing text with AI: {str(e)}"
 
+def request_term_explanation(term):
+    """Ask the AI to explain a legal term, raising if the call fails"""
+    system_prompt = app.config['TERM_EXPLANATION_PROMPT']
+    
+    human_prompt = f"Please explain this legal term: {term}"
+    
+    messages = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=human_prompt)
+    ]
+    
+    response = llm.invoke(messages, task='explain')
+    return response.content
+
 def explain_legal_term(term):
     """Use AI to explain a legal term"""
     try:
-        system_prompt = app.config['TERM_EXPLANATION_PROMPT']
-        
-        human_prompt = f"Please explain this legal term: {term}"
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=human_prompt)
-        ]
-        
-        response = llm.invoke(messages)
-        return response.content
+        return request_term_explanation(term)
     except Exception as e:
         return f"Error explaining term: {str(e)}"
 
@@ -117,24 +431,104 @@ def generate_document_summary(text):
     try:
         system_prompt = app.config['SUMMARY_PROMPT']
         
-        human_prompt = f"Please summarize this legal document:\n\n{text[:3000]}"  # Limit text length
+        human_prompt = f"Please summarize this legal document:\n\n{text[:app.config['MAX_SUMMARY_LENGTH']]}"  # Limit text length
         
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=human_prompt)
         ]
         
-        response = llm.invoke(messages)
+        response = llm.invoke(messages, task='summarize')
         return response.content
     except Exception as e:
         return f"Error generating summary: {str(e)}"
 
+@lru_cache(maxsize=None)
+def compile_legal_term_patterns():
+    """Combine the configured term patterns into one case-sensitive and one case-insensitive regex"""
+    sensitive = [pattern for pattern in config.LEGAL_TERM_PATTERNS if pattern in config.CASE_SENSITIVE_TERM_PATTERNS]
+    insensitive = [pattern for pattern in config.LEGAL_TERM_PATTERNS if pattern not in config.CASE_SENSITIVE_TERM_PATTERNS]
+    return [re.compile('|'.join(sensitive)), re.compile('|'.join(insensitive), re.IGNORECASE)]
+
+def preload():
+    """Load everything workers can share before a production server forks"""
+    compile_legal_term_patterns()
+    
+    # Round-trip a blank PDF and open the default DOCX template so the parsers'
+    # lazily loaded modules and templates are in memory before the fork
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+    for page in PyPDF2.PdfReader(buffer).pages:
+        page.extract_text()
+    docx.Document()
+    
+    document_store.purge()
+
+def warm_up_llm_clients():
+    """Open and verify connections to every backend when LLM_WARMUP is enabled"""
+    if app.config['LLM_WARMUP']:
+        return client_pool.warmup(config.get_model_backends())
+
+def estimate_request_tokens(*prompt_limits, documents=1):
+    """Estimate prompt tokens for a request from its body size and the AI stages' input limits"""
+    size = request.content_length or 0
+    return sum(min(size, limit * documents) for limit in prompt_limits) // app.config['CHARS_PER_TOKEN']
+
+def admission_controlled(*prompt_limit_keys, documents_key=None):
+    """Reject requests with 429 and Retry-After when the client or server is over its limits"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            documents = app.config[documents_key] if documents_key else 1
+            cost = estimate_request_tokens(*(app.config[key] for key in prompt_limit_keys), documents=documents)
+            ticket = admission.try_acquire(request.remote_addr, cost)
+            if ticket is None:
+                response = jsonify({'error': 'Server is busy, please retry shortly'})
+                response.headers['Retry-After'] = str(admission.retry_after())
+                return response, 429
+            
+            start = time.monotonic()
+            try:
+                response = view(*args, **kwargs)
+            except Exception:
+                admission.release(ticket, time.monotonic() - start)
+                raise
+            # A streamed response is still working until the client has read it
+            if isinstance(response, Response) and response.is_streamed:
+                response.call_on_close(lambda: admission.release(ticket, time.monotonic() - start))
+            else:
+                admission.release(ticket, time.monotonic() - start)
+            return response
+        return wrapper
+    return decorator
+
+@app.errorhandler(413)
+def file_too_large(error):
+    """Reject uploads over MAX_FILE_SIZE"""
+    return jsonify({'error': f"File size must be less than {app.config['MAX_FILE_SIZE'] // (1024 * 1024)}MB"}), 413
+
 @app.route('/')
 def index():
     """Main page"""
     return render_template('index.html')
 
+@app.route('/term-patterns')
+def term_patterns():
+    """Combined legal term patterns for client-side detection"""
+    sensitive, insensitive = compile_legal_term_patterns()
+    response = jsonify({'patterns': [
+        {'source': sensitive.pattern, 'flags': 'g'},
+        {'source': insensitive.pattern, 'flags': 'gi'}
+    ]})
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response
+
 @app.route('/upload', methods=['POST'])
+@admission_controlled('MAX_TEXT_LENGTH', 'MAX_SUMMARY_LENGTH')
 def upload_file():
     """Handle file upload and processing"""
     if 'file' not in request.files:
@@ -146,24 +540,30 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         try:
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            filename, file_extension = upload_name(file.filename)
+            note_upload_type(file_extension)
+            writer = document_store.create(filename, app.config['DOCUMENT_MAX_CHARS'])
+            file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{writer.document_id}_{filename}")
+            try:
+                with upload_profiler.stage('save'):
+                    file.save(file_path)
+            except Exception:
+                document_store.discard(writer.document_id)
+                raise
             
-            # Extract text from file
-            file_extension = filename.rsplit('.', 1)[1].lower()
-            extracted_text = extract_text_from_file(file_path, file_extension)
+            # Extract only as much text as the AI stage will consume; the rest
+            # of the document is extracted into the store off the request path
+            extracted_text = start_extraction(writer, file_path, file_extension)
             
             # Process with AI
-            simplified_text = simplify_legal_text(extracted_text)
-            summary = generate_document_summary(extracted_text)
-            
-            # Clean up uploaded file
-            os.remove(file_path)
+            with upload_profiler.stage('simplify'):
+                simplified_text = simplify_legal_text(extracted_text)
+            with upload_profiler.stage('summarize'):
+                summary = generate_document_summary(extracted_text)
             
             return jsonify({
                 'success': True,
-                'original_text': extracted_text,
+                'document_id': writer.document_id,
                 'simplified_text': simplified_text,
                 'summary': summary,
                 'filename': filename
@@ -176,7 +576,99 @@ def upload_file():
     
     return jsonify({'error': 'Invalid file type'}), 400
 
+def analyze_document(environ, filename, document_id, extracted_text):
+    """Run the AI stages for one extracted batch file"""
+    # A fresh context for the batch request lets the usage ledger attribute these calls to its route
+    with app.request_context(environ):
+        with upload_profiler.stage('simplify'):
+            simplified_text = simplify_legal_text(extracted_text)
+        with upload_profiler.stage('summarize'):
+            summary = generate_document_summary(extracted_text)
+    return {
+        'success': True,
+        'document_id': document_id,
+        'simplified_text': simplified_text,
+        'summary': summary,
+        'filename': filename
+    }
+
+@app.route('/upload/batch', methods=['POST'])
+@admission_controlled('MAX_TEXT_LENGTH', 'MAX_SUMMARY_LENGTH', documents_key='BATCH_MAX_FILES')
+def upload_batch():
+    """Process several uploaded files at once, streaming one NDJSON result per file as each finishes"""
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    if len(files) > app.config['BATCH_MAX_FILES']:
+        return jsonify({'error': f"At most {app.config['BATCH_MAX_FILES']} files can be uploaded at once"}), 400
+    
+    results = queue.Queue()
+    # Filenames still owed a result line, in upload order
+    outstanding = [upload_name(file.filename)[0] if allowed_file(file.filename) else file.filename for file in files]
+    
+    def report_failure(filename, error):
+        message = str(error) if isinstance(error, ValueError) else f'Error processing file: {str(error)}'
+        results.put({'success': False, 'error': message, 'filename': filename})
+    
+    # Callbacks always enqueue a line, whatever goes wrong, so the stream below is never left waiting
+    def report_result(filename, future):
+        try:
+            results.put(future.result())
+        except Exception as e:
+            report_failure(filename, e)
+    
+    def queue_ai_stage(filename, analyze, extraction):
+        try:
+            extracted_text = extraction.result()
+            # The AI pool is shared by every batch, so it caps concurrent AI stages process-wide
+            ai_executor.submit(analyze, extracted_text).add_done_callback(partial(report_result, filename))
+        except Exception as e:
+            report_failure(filename, e)
+    
+    for file in files:
+        if not allowed_file(file.filename):
+            results.put({'success': False, 'error': 'Invalid file type', 'filename': file.filename})
+            continue
+        filename, file_extension = upload_name(file.filename)
+        writer = None
+        try:
+            note_upload_type(file_extension)
+            writer = document_store.create(filename, app.config['DOCUMENT_MAX_CHARS'])
+            source = stage_upload(file, writer, file_extension)
+        except Exception as e:
+            if writer is not None:
+                document_store.discard(writer.document_id)
+            report_failure(filename, e)
+            continue
+        
+        analyze = partial(analyze_document, request.environ, filename, writer.document_id)
+        try:
+            extraction = batch_executor.submit(start_extraction, writer, source, file_extension)
+        except RuntimeError as e:
+            document_store.discard(writer.document_id)
+            report_failure(filename, e)
+            continue
+        extraction.add_done_callback(partial(queue_ai_stage, filename, analyze))
+    
+    deadline = time.monotonic() + app.config['BATCH_TIMEOUT']
+    
+    def generate():
+        while outstanding:
+            try:
+                result = results.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if result['filename'] in outstanding:
+                outstanding.remove(result['filename'])
+            yield json.dumps(result) + '\n'
+        # Files that missed the deadline get an error line so the client is not left waiting
+        for filename in outstanding:
+            yield json.dumps({'success': False, 'error': 'Timed out processing file', 'filename': filename}) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/simplify', methods=['POST'])
+@admission_controlled('MAX_TEXT_LENGTH')
 def simplify_text():
     """Simplify legal text"""
     data = request.get_json()
@@ -199,7 +691,11 @@ def explain_term():
         return jsonify({'error': 'No term provided'}), 400
     
     term = data['term']
-    explanation = explain_legal_term(term)
+    try:
+        explanation = request_term_explanation(term)
+    except Exception as e:
+        # An error status, not explanation text, so clients never cache the failure
+        return jsonify({'error': f'Error explaining term: {str(e)}'}), 502
     
     return jsonify({
         'success': True,
@@ -207,6 +703,7 @@ def explain_term():
     })
 
 @app.route('/summarize', methods=['POST'])
+@admission_controlled('MAX_SUMMARY_LENGTH')
 def summarize_document():
     """Generate document summary"""
     data = request.get_json()
@@ -221,10 +718,74 @@ def summarize_document():
         'summary': summary
     })
 
+@app.route('/documents/<document_id>/text')
+def document_text(document_id):
+    """Serve stored document text by page or by character range"""
+    page_size = app.config['ORIGINAL_TEXT_PAGE_SIZE']
+    if 'start' in request.args:
+        start = request.args.get('start', 0, type=int)
+        end = min(request.args.get('end', start + page_size, type=int), start + page_size)
+        if start < 0 or end < start:
+            return jsonify({'error': 'Invalid text range'}), 400
+        result = document_store.get_range(document_id, start, end)
+    else:
+        page = request.args.get('page', 0, type=int)
+        if page < 0:
+            return jsonify({'error': 'Invalid page'}), 400
+        result = document_store.get_page(document_id, page)
+    
+    if result is None:
+        return jsonify({'error': 'Document not found or expired'}), 404
+    
+    # 202 tells the client the page is still being extracted
+    status = 200 if result.get('ready', True) else 202
+    return jsonify({'success': True, **result}), status
+
+@app.after_request
+def compress_response(response):
+    """Compress large JSON responses for clients that accept brotli or gzip"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers
+            or (response.content_length or 0) < app.config['COMPRESSION_MIN_SIZE']):
+        return response
+    
+    accepted = request.headers.get('Accept-Encoding', '')
+    if brotli is not None and 'br' in accepted:
+        response.set_data(brotli.compress(response.get_data()))
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in accepted:
+        response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Model routing decisions and backend health"""
+    return jsonify({'router': llm.metrics(), 'clients': client_pool.snapshot(), 'upload_memory': upload_profiler.report()})
+
+@app.route('/reports/usage')
+def usage_report_view():
+    """Aggregate LLM spend and latency, e.g. ?group_by=route,model,day&since=2026-01-01"""
+    group_by = request.args.get('group_by', 'route,model,day').split(',')
+    if any(column not in PUBLIC_GROUP_COLUMNS for column in group_by):
+        return jsonify({'error': f"group_by must be drawn from: {', '.join(PUBLIC_GROUP_COLUMNS)}"}), 400
+    
+    # Bounded so a stuck ledger cannot hold the request; the report then lags slightly
+    flushed = usage_ledger.flush()
+    try:
+        rows = usage_report(app.config['USAGE_LEDGER_PATH'], group_by, request.args.get('since'), request.args.get('until'))
+    except sqlite3.Error as e:
+        return jsonify({'error': f'Usage ledger unavailable: {str(e)}'}), 503
+    return jsonify({'success': True, 'group_by': group_by, 'rows': rows, 'flushed': flushed, 'dropped': usage_ledger.dropped})
+
 @app.route('/health')
 def health_check():
-    """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'message': 'Legal Document AI Simplifier is running'})
+    """Health check endpoint, reporting not ready while admission limits are saturated"""
+    if admission.is_ready():
+        return jsonify({'status': 'healthy', 'message': 'Legal Document AI Simplifier is running', 'admission': admission.snapshot()})
+    return jsonify({'status': 'overloaded', 'message': 'Legal Document AI Simplifier is at capacity', 'admission': admission.snapshot()}), 503
 
 if __name__ == '__main__':
+    warm_up_llm_clients()
     app.run(debug=os.getenv('FLASK_DEBUG', 'True').lower() == 'true', host='0.0.0.0', port=5000)
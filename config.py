@@ -4,6 +4,7 @@ Customize these settings to match your needs
 """
 
 import os
+import json
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -18,20 +19,102 @@ class Config:
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4')
     OPENAI_TEMPERATURE = float(os.getenv('OPENAI_TEMPERATURE', 0.3))
     
+    # Model Router Configuration
+    # JSON list of extra OpenAI-compatible backends, e.g.
+    # [{"name": "cheap", "model": "gpt-4o-mini", "tier": "fast"},
+    #  {"name": "local", "model": "llama3", "base_url": "http://localhost:8000/v1", "api_key": "none", "tier": "fast"}]
+    OPENAI_BACKENDS = os.getenv('OPENAI_BACKENDS')
+    ROUTER_SHORT_PROMPT_CHARS = int(os.getenv('ROUTER_SHORT_PROMPT_CHARS', 1500))  # Prompts up to this size go to the fast tier
+    ROUTER_STATS_WINDOW = 100  # Recent calls per backend used for latency and error rates
+    ROUTER_MAX_ERROR_RATE = 0.5  # Backends failing more often than this are tried last
+    ROUTER_ERROR_TTL = float(os.getenv('ROUTER_ERROR_TTL', 30))  # Seconds a failed call counts against a backend
+    
+    # LLM Connection Pool Configuration
+    LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 50))  # Open connections per process across all backends
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', 20))  # Idle connections kept for reuse
+    LLM_KEEPALIVE_EXPIRY = 120.0  # Seconds an idle connection is kept open
+    LLM_CONNECT_TIMEOUT = 5.0  # Seconds allowed for connecting and the TLS handshake
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 60))  # Seconds allowed for a whole LLM response
+    LLM_WARMUP = os.getenv('LLM_WARMUP', 'False').lower() == 'true'  # Open connections to every backend at startup
+    LLM_WARMUP_CONNECTIONS = int(os.getenv('LLM_WARMUP_CONNECTIONS', 2))  # Connections opened per backend by the warmup
+    
+    # Usage Ledger Configuration
+    USAGE_LEDGER_PATH = os.getenv('USAGE_LEDGER_PATH', 'usage.sqlite3')
+    USAGE_LEDGER_BATCH_SIZE = 100  # Entries written per transaction
+    USAGE_LEDGER_FLUSH_INTERVAL = 2.0  # Seconds a partial batch waits before it is written
+    # USD per 1K prompt and completion tokens; override with a JSON object in MODEL_PRICING
+    MODEL_PRICING = json.loads(os.getenv('MODEL_PRICING') or json.dumps({
+        'gpt-4': [0.03, 0.06],
+        'gpt-4o-mini': [0.00015, 0.0006],
+        'gpt-3.5-turbo': [0.0005, 0.0015]
+    }))
+    
+    # Request Hedging Configuration
+    HEDGE_REQUESTS = os.getenv('HEDGE_REQUESTS', 'False').lower() == 'true'
+    HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', 95))  # Hedge once a call is slower than this latency percentile
+    HEDGE_MIN_DELAY = 0.25  # Never hedge sooner than this many seconds
+    HEDGE_DEFAULT_DELAY = 2.0  # Hedge deadline before a backend has latency samples
+    HEDGE_MAX_RATIO = float(os.getenv('HEDGE_MAX_RATIO', 0.1))  # Cap on hedged calls as a share of all calls
+    HEDGE_WORKERS = 32  # Threads available for hedged calls
+    
     # Flask Configuration
     SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
     DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
-    HOST = '0.0.0.0'
-    PORT = 5000
+    HOST = os.getenv('HOST', '0.0.0.0')
+    PORT = int(os.getenv('PORT', 5000))
+    
+    # Production Server Configuration
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', 4))  # Concurrent requests per worker
+    SERVER_MAX_REQUESTS = int(os.getenv('SERVER_MAX_REQUESTS', 500))  # Recycle a worker after this many requests
+    SERVER_MAX_REQUESTS_JITTER = 50  # Spread recycling so workers do not restart together
+    SERVER_TIMEOUT = int(os.getenv('SERVER_TIMEOUT', 120))  # Seconds before a stuck worker is killed
     
     # File Upload Configuration
     MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 10 * 1024 * 1024))  # 10MB
+    MAX_CONTENT_LENGTH = MAX_FILE_SIZE  # Flask rejects larger request bodies with 413
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
     ALLOWED_EXTENSIONS = os.getenv('ALLOWED_EXTENSIONS', 'pdf,docx,txt').split(',')
     
+    # Text Extraction Configuration
+    MAX_EXTRACT_CHARS = int(os.getenv('MAX_EXTRACT_CHARS', 200000))  # Stop extracting documents after this many characters
+    CHARS_PER_TOKEN = 4  # Rough estimate used to turn token budgets into character budgets
+    TXT_ENCODING_SAMPLE_SIZE = 64 * 1024  # Bytes sampled for encoding detection
+    TXT_READ_CHUNK_SIZE = 64 * 1024  # Characters decoded per read
+    
+    # Document Store Configuration
+    DOCUMENT_STORE_FOLDER = os.getenv('DOCUMENT_STORE_FOLDER', os.path.join(UPLOAD_FOLDER, 'documents'))
+    DOCUMENT_TTL = int(os.getenv('DOCUMENT_TTL', 60 * 60))  # Seconds extracted text stays available
+    DOCUMENT_STORE_MAX_BYTES = int(os.getenv('DOCUMENT_STORE_MAX_BYTES', 200 * 1024 * 1024))  # 200MB across all documents
+    DOCUMENT_MAX_CHARS = int(os.getenv('DOCUMENT_MAX_CHARS', 10 * 1000 * 1000))  # Characters stored per document; longer ones are truncated
+    ORIGINAL_TEXT_PAGE_SIZE = 20000  # Characters per page of original text
+    BACKGROUND_EXTRACTION_WORKERS = 2  # Threads extracting the rest of a document after /upload responds
+    COMPRESSION_MIN_SIZE = 1024  # Smallest JSON response worth compressing
+    UPLOAD_MEMORY_BUDGET = int(os.getenv('UPLOAD_MEMORY_BUDGET', 32 * 1024 * 1024))  # Bytes one upload may hold in memory at once
+    UPLOAD_PROFILING = os.getenv('UPLOAD_PROFILING', 'False').lower() == 'true'  # Measure peak allocation per upload stage
+    
+    # Traffic Recording Configuration
+    TRAFFIC_RECORDING = os.getenv('TRAFFIC_RECORDING', 'False').lower() == 'true'  # Log every request for replay.py
+    TRAFFIC_LOG_PATH = os.getenv('TRAFFIC_LOG_PATH', 'traffic.jsonl')
+    
+    # Batch Upload Configuration
+    BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', 10))  # Files accepted by one /upload/batch request
+    BATCH_EXTRACTION_WORKERS = int(os.getenv('BATCH_EXTRACTION_WORKERS', 4))  # Threads extracting batch files in parallel
+    BATCH_BUFFER_MAX_BYTES = 1024 * 1024  # Batch files up to this size skip the disk when their extractor reads buffers
+    AI_CONCURRENCY = int(os.getenv('AI_CONCURRENCY', 4))  # AI stages run at once across all batch uploads in a process
+    BATCH_TIMEOUT = int(os.getenv('BATCH_TIMEOUT', 300))  # Seconds a batch waits for its results before reporting the rest as failed
+    
+    # Admission Control Configuration (limits are shared by all server processes)
+    ADMISSION_STATE_PATH = os.getenv('ADMISSION_STATE_PATH', 'admission.sqlite3')  # Tickets of admitted requests in flight
+    ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', 16))  # Expensive requests in flight
+    ADMISSION_MAX_CONCURRENT_PER_CLIENT = int(os.getenv('ADMISSION_MAX_CONCURRENT_PER_CLIENT', 2))
+    ADMISSION_MAX_TOKENS = int(os.getenv('ADMISSION_MAX_TOKENS', 20000))  # Estimated prompt tokens in flight
+    ADMISSION_MAX_TOKENS_PER_CLIENT = int(os.getenv('ADMISSION_MAX_TOKENS_PER_CLIENT', 4000))
+    
     # AI Processing Configuration
     MAX_TEXT_LENGTH = 4000  # Maximum characters for AI processing
     MAX_SUMMARY_LENGTH = 3000  # Maximum characters for summary generation
+    EXTRACTION_WINDOW = 1000  # Extra characters extracted past the prompt budget for chunking
     
     # UI Configuration
     APP_NAME = "Legal Document AI Simplifier"
@@ -62,6 +145,9 @@ class Config:
         r'\b(?:consideration|offer|acceptance|capacity|legality|mutual assent|meeting of minds)\b'
     ]
     
+    # Patterns from LEGAL_TERM_PATTERNS that match case-sensitively; the rest ignore case
+    CASE_SENSITIVE_TERM_PATTERNS = LEGAL_TERM_PATTERNS[:1]
+    
     # Common Legal Terms for Quick Access
     COMMON_LEGAL_TERMS = [
         "Force Majeure",
@@ -133,6 +219,20 @@ class Config:
         
         return errors
     
+    @classmethod
+    def get_model_backends(cls):
+        """Primary backend from the OPENAI_* settings plus any from OPENAI_BACKENDS"""
+        backends = [{
+            'name': 'primary',
+            'model': cls.OPENAI_MODEL,
+            'base_url': cls.OPENAI_API_BASE_URL,
+            'api_key': cls.OPENAI_API_KEY,
+            'tier': 'quality'
+        }]
+        for backend in json.loads(cls.OPENAI_BACKENDS or '[]'):
+            backends.append({'base_url': cls.OPENAI_API_BASE_URL, 'api_key': cls.OPENAI_API_KEY, **backend})
+        return backends
+    
     @classmethod
     def get_upload_folder(cls):
         """Get upload folder path and create if it doesn't exist"""
@@ -0,0 +1,207 @@
+"""
+Server-side storage for extracted document text
+Documents are kept on disk as fixed-size text pages so the original text can be
+served page by page, and shared by every server process, instead of being sent
+inside the /upload response
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+
+DOCUMENT_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+class DocumentStore:
+    """Disk-backed page store with a TTL and a bound on total size"""
+
+    def __init__(self, folder, page_size, ttl, max_bytes):
+        self.folder = folder
+        self.page_size = page_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(folder, exist_ok=True)
+
+    def create(self, filename, max_chars):
+        """Start a new document and return a writer for its text"""
+        self.purge()
+        document_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.folder, document_id))
+        writer = DocumentWriter(self, document_id, filename, max_chars)
+        writer.save_meta()
+        return writer
+
+    def document_path(self, document_id, name=''):
+        """Path inside a document's folder, or None for a malformed id"""
+        if not DOCUMENT_ID_PATTERN.fullmatch(document_id or ''):
+            return None
+        return os.path.join(self.folder, document_id, name)
+
+    def get_meta(self, document_id):
+        """Load a document's metadata, or None if it is unknown or expired"""
+        path = self.document_path(document_id, 'meta.json')
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if time.time() - meta['created'] > self.ttl:
+            return None
+        return meta
+
+    def read_page(self, document_id, page):
+        """Read one stored page of text"""
+        with open(self.document_path(document_id, f'page-{page:05d}.txt'), 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def get_page(self, document_id, page):
+        """Return a page of text with paging metadata, or None if the document is gone"""
+        meta = self.get_meta(document_id)
+        if meta is None:
+            return None
+
+        ready = page < meta['page_count']
+        return {
+            'document_id': document_id,
+            'page': page,
+            'text': self.read_page(document_id, page) if ready else '',
+            'ready': ready or meta['complete'],
+            'page_count': meta['page_count'],
+            'complete': meta['complete'],
+            'truncated': meta['truncated'],
+            'failed': meta['failed'],
+            'has_more': page + 1 < meta['page_count'] or not meta['complete'],
+        }
+
+    def get_range(self, document_id, start, end):
+        """Return the stored text between two character offsets"""
+        meta = self.get_meta(document_id)
+        if meta is None:
+            return None
+
+        end = min(end, meta['total_chars'])
+        parts = []
+        for page in range(start // self.page_size, -(-end // self.page_size)):
+            if page >= meta['page_count']:
+                break
+            page_start = page * self.page_size
+            text = self.read_page(document_id, page)
+            parts.append(text[max(start - page_start, 0):end - page_start])
+        text = ''.join(parts)
+        return {
+            'document_id': document_id,
+            'start': start,
+            'end': start + len(text),
+            'text': text,
+            'total_chars': meta['total_chars'],
+            'complete': meta['complete'],
+            'truncated': meta['truncated'],
+            'failed': meta['failed'],
+        }
+
+    def discard(self, document_id):
+        """Delete a document, e.g. one whose extraction failed"""
+        path = self.document_path(document_id)
+        if path is not None:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def purge(self):
+        """Delete expired documents, then the oldest ones while over the size bound"""
+        documents = []
+        for document_id in os.listdir(self.folder):
+            path = os.path.join(self.folder, document_id)
+            try:
+                with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as file:
+                    meta = json.load(file)
+            except (OSError, ValueError):
+                # Folders without readable metadata are left to the TTL by directory age
+                meta = {'created': os.path.getmtime(path), 'size': 0}
+            if time.time() - meta['created'] > self.ttl:
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                documents.append((meta['created'], meta['size'], path))
+
+        total = sum(size for _, size, _ in documents)
+        for _, size, path in sorted(documents):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+class DocumentWriter:
+    """Buffers extracted text and writes it to the store one full page at a time"""
+
+    def __init__(self, store, document_id, filename, max_chars):
+        self.store = store
+        self.document_id = document_id
+        self.filename = filename
+        self.max_chars = max_chars
+        self.created = time.time()
+        self.buffer = []
+        self.buffered = 0
+        self.page_count = 0
+        self.total_chars = 0
+        self.size = 0
+        self.complete = False
+        self.truncated = False
+        self.failed = False
+
+    def write(self, text):
+        """Append text, returning False once the document's character bound is reached"""
+        room = self.max_chars - self.total_chars - self.buffered
+        if len(text) > room:
+            text = text[:room]
+            self.truncated = True
+
+        while text:
+            take = self.store.page_size - self.buffered
+            self.buffer.append(text[:take])
+            self.buffered += len(text[:take])
+            text = text[take:]
+            if self.buffered == self.store.page_size:
+                self.flush_page()
+        return not self.truncated
+
+    def flush_page(self):
+        """Write the buffered text out as the next page"""
+        text = ''.join(self.buffer)
+        path = self.store.document_path(self.document_id, f'page-{self.page_count:05d}.txt')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        self.buffer = []
+        self.buffered = 0
+        self.page_count += 1
+        self.total_chars += len(text)
+        self.size += os.path.getsize(path)
+        self.save_meta()
+
+    def close(self, failed=False):
+        """Write the final partial page and mark the document complete, or failed if extraction stopped early"""
+        if self.buffered:
+            self.flush_page()
+        self.complete = True
+        self.failed = failed
+        self.save_meta()
+
+    def save_meta(self):
+        """Atomically replace the document's metadata so readers never see a partial file"""
+        meta = {
+            'filename': self.filename,
+            'created': self.created,
+            'page_count': self.page_count,
+            'total_chars': self.total_chars,
+            'size': self.size,
+            'complete': self.complete,
+            'truncated': self.truncated,
+            'failed': self.failed,
+        }
+        path = self.store.document_path(self.document_id, 'meta.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Token and cost accounting for Legal Document AI Simplifier
+Every LLM call is appended to a local SQLite ledger by a background thread,
+so recording adds no latency to the request. Spend and latency can be
+aggregated by route, model and day through /reports/usage or from the shell:
+
+    python ledger.py --by route,model,day --since 2026-01-01
+"""
+
+import os
+import sys
+import time
+import queue
+import logging
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timezone
+
+COLUMNS = [
+    'ts', 'day', 'route', 'client', 'task', 'backend', 'model', 'prompt_tokens',
+    'completion_tokens', 'cost', 'latency', 'status', 'attempt', 'cache_status', 'response_model',
+]
+
+# Columns a report can be grouped by
+GROUP_COLUMNS = ['route', 'model', 'day', 'backend', 'task', 'client', 'status', 'response_model']
+
+# Client addresses are personal data, so only the command-line report groups by them
+PUBLIC_GROUP_COLUMNS = [column for column in GROUP_COLUMNS if column != 'client']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    route TEXT,
+    client TEXT,
+    task TEXT,
+    backend TEXT,
+    model TEXT,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    latency REAL NOT NULL,
+    status TEXT NOT NULL,
+    attempt TEXT,
+    cache_status TEXT,
+    response_model TEXT
+)
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def connect(path):
+    """Open the ledger database, creating the table on first use"""
+    connection = sqlite3.connect(path, timeout=30)
+    # WAL lets every server process append while reports read
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute(SCHEMA)
+    # Ledgers written before the model snapshot was recorded lack its column
+    if 'response_model' not in {row[1] for row in connection.execute('PRAGMA table_info(usage)')}:
+        connection.execute('ALTER TABLE usage ADD COLUMN response_model TEXT')
+    return connection
+
+
+def token_usage(response):
+    """Prompt and completion token counts from a LangChain chat response"""
+    usage = getattr(response, 'usage_metadata', None)
+    if isinstance(usage, dict):
+        return usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+    metadata = getattr(response, 'response_metadata', None)
+    if isinstance(metadata, dict) and isinstance(metadata.get('token_usage'), dict):
+        return metadata['token_usage'].get('prompt_tokens', 0), metadata['token_usage'].get('completion_tokens', 0)
+    return 0, 0
+
+
+class UsageLedger:
+    """Append-only SQLite ledger written in batches by a background thread"""
+
+    def __init__(self, path, pricing, batch_size=100, flush_interval=2.0, max_pending=10000):
+        self.path = path
+        self.pricing = pricing
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self._writer = None
+        self._writer_pid = None
+
+    def prices(self, model):
+        """Per-1K prices for a model, falling back to the longest priced prefix (gpt-4o-mini-2024-07-18 -> gpt-4o-mini)"""
+        if model in self.pricing:
+            return self.pricing[model]
+        prefixes = [name for name in self.pricing if model and model.startswith(name)]
+        return self.pricing[max(prefixes, key=len)] if prefixes else (0.0, 0.0)
+
+    def cost(self, model, prompt_tokens, completion_tokens):
+        """Spend in USD from MODEL_PRICING's per-1K-token prices"""
+        prompt_price, completion_price = self.prices(model)
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+    def record(self, response, latency, status='ok', model=None, **fields):
+        """Queue one LLM call; never blocks the caller"""
+        prompt_tokens, completion_tokens = token_usage(response)
+        # Priced by the configured model; the dated snapshot the API reports is kept alongside
+        metadata = getattr(response, 'response_metadata', None)
+        response_model = metadata.get('model_name') if isinstance(metadata, dict) else None
+        now = time.time()
+        entry = {
+            'ts': now,
+            'day': datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m-%d'),
+            'model': model or response_model,
+            'response_model': response_model,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'cost': self.cost(model or response_model, prompt_tokens, completion_tokens),
+            'latency': latency,
+            'status': status,
+            **fields,
+        }
+        self.ensure_writer()
+        try:
+            self.pending.put_nowait(tuple(entry.get(column) for column in COLUMNS))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def ensure_writer(self):
+        """Start the writer thread, once per process so forked workers get their own"""
+        with self.lock:
+            if self._writer_pid != os.getpid() or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self.write_batches, name='usage-ledger', daemon=True)
+                self._writer_pid = os.getpid()
+                self._writer.start()
+
+    def write_batches(self):
+        """Drain the queue in batches, one transaction per batch"""
+        connection = None
+        placeholders = ', '.join('?' for _ in COLUMNS)
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                # (Re)connected per batch after a failure, so an unwritable ledger never stops the thread
+                if connection is None:
+                    connection = connect(self.path)
+                with connection:
+                    connection.executemany(f"INSERT INTO usage ({', '.join(COLUMNS)}) VALUES ({placeholders})", batch)
+            except (sqlite3.Error, OSError) as e:
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                with self.lock:
+                    self.dropped += len(batch)
+                    dropped = self.dropped
+                logger.warning("Dropped %d usage entries writing %s (%d so far): %s", len(batch), self.path, dropped, e)
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
+
+    def flush(self, timeout=5.0):
+        """Wait until every queued entry has been written, returning False if that takes over timeout seconds"""
+        if self._writer_pid != os.getpid() or not self._writer.is_alive():
+            return self.pending.unfinished_tasks == 0
+        deadline = time.monotonic() + timeout
+        with self.pending.all_tasks_done:
+            while self.pending.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.pending.all_tasks_done.wait(remaining)
+        return True
+
+
+def report(path, group_by=('route', 'model', 'day'), since=None, until=None):
+    """Aggregate calls, tokens, spend and latency grouped by the given columns"""
+    group_by = [column for column in group_by if column in GROUP_COLUMNS] or ['day']
+    conditions, params = [], []
+    if since:
+        conditions.append('day >= ?')
+        params.append(since)
+    if until:
+        conditions.append('day <= ?')
+        params.append(until)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    columns = ', '.join(group_by)
+    query = f"""
+        SELECT {columns}, COUNT(*), SUM(status != 'ok'), SUM(prompt_tokens), SUM(completion_tokens),
+               SUM(cost), AVG(latency), MAX(latency)
+        FROM usage {where}
+        GROUP BY {columns}
+        ORDER BY {columns}
+    """
+    connection = connect(path)
+    try:
+        rows = connection.execute(query, params).fetchall()
+    finally:
+        connection.close()
+
+    return [
+        {
+            **dict(zip(group_by, row)),
+            'calls': row[len(group_by)],
+            'errors': row[len(group_by) + 1],
+            'prompt_tokens': row[len(group_by) + 2],
+            'completion_tokens': row[len(group_by) + 3],
+            'cost': round(row[len(group_by) + 4], 6),
+            'avg_latency': round(row[len(group_by) + 5], 3),
+            'max_latency': round(row[len(group_by) + 6], 3),
+        }
+        for row in rows
+    ]
+
+
+def main(argv=None):
+    """Print a usage report from the command line"""
+    from config import get_config
+
+    parser = argparse.ArgumentParser(description="Aggregate LLM spend and latency from the usage ledger")
+    parser.add_argument('--db', default=get_config().USAGE_LEDGER_PATH, help="Ledger database path")
+    parser.add_argument('--by', default='route,model,day', help=f"Comma-separated columns from: {', '.join(GROUP_COLUMNS)}")
+    parser.add_argument('--since', help="First day to include (YYYY-MM-DD)")
+    parser.add_argument('--until', help="Last day to include (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    rows = report(args.db, args.by.split(','), args.since, args.until)
+    if not rows:
+        print("No usage recorded")
+        return 0
+
+    headers = list(rows[0])
+    widths = [max(len(header), *(len(str(row[header])) for row in rows)) for header in headers]
+    print('  '.join(header.ljust(width) for header, width in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(str(row[header]).ljust(width) for header, width in zip(headers, widths)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
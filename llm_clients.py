@@ -0,0 +1,114 @@
+"""
+Shared LLM connection pool for Legal Document AI Simplifier
+One keep-alive HTTP client per process is shared by every chat model, in the
+Flask app and in Streamlit, so TLS handshakes are paid once rather than per
+client. An optional warmup opens connections to each backend and checks that
+it answers before the first real request does.
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+
+DEFAULT_BASE_URL = 'https://api.openai.com/v1'
+
+logger = logging.getLogger(__name__)
+
+
+class ForkSafeTransport(httpx.BaseTransport):
+    """Connection pool that is rebuilt in each forked worker instead of sharing the parent's sockets"""
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.lock = threading.Lock()
+        self._transport = None
+        self._transport_pid = None
+
+    def transport(self):
+        """The current process's connection pool, created on first use"""
+        with self.lock:
+            if self._transport is None or self._transport_pid != os.getpid():
+                self._transport = httpx.HTTPTransport(limits=self.limits)
+                self._transport_pid = os.getpid()
+            return self._transport
+
+    def handle_request(self, request):
+        return self.transport().handle_request(request)
+
+    def close(self):
+        with self.lock:
+            if self._transport is not None and self._transport_pid == os.getpid():
+                self._transport.close()
+            self._transport = None
+
+
+class ClientPool:
+    """Process-wide HTTP client handed to every ChatOpenAI instance"""
+
+    def __init__(self, max_connections, max_keepalive_connections, keepalive_expiry, connect_timeout, timeout,
+                 warmup_connections=2):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.warmup_connections = warmup_connections
+        # Chat models must be given this too: ChatOpenAI overrides the client's timeout on every request
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.client = httpx.Client(transport=ForkSafeTransport(self.limits), timeout=self.timeout)
+        self.last_warmup = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the pool from the LLM_* settings"""
+        return cls(
+            config.LLM_MAX_CONNECTIONS,
+            config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            config.LLM_KEEPALIVE_EXPIRY,
+            config.LLM_CONNECT_TIMEOUT,
+            config.LLM_TIMEOUT,
+            warmup_connections=config.LLM_WARMUP_CONNECTIONS
+        )
+
+    def check_endpoint(self, base_url, api_key):
+        """List the endpoint's models, which opens a connection and verifies the key"""
+        start = time.monotonic()
+        try:
+            response = self.client.get(f"{base_url.rstrip('/')}/models",
+                                       headers={'Authorization': f'Bearer {api_key}'} if api_key else {})
+            return {'ok': response.is_success, 'status': response.status_code, 'latency': round(time.monotonic() - start, 3)}
+        except httpx.HTTPError as e:
+            return {'ok': False, 'error': str(e), 'latency': round(time.monotonic() - start, 3)}
+
+    def warmup(self, backends):
+        """Open warmup_connections connections to every distinct backend endpoint and report each one"""
+        endpoints = {}
+        for spec in backends:
+            endpoints.setdefault(spec.get('base_url') or DEFAULT_BASE_URL, spec.get('api_key'))
+
+        # Concurrent checks so each one holds its own connection, all returned to the pool afterwards
+        checks = [(base_url, api_key) for base_url, api_key in endpoints.items() for _ in range(self.warmup_connections)]
+        with ThreadPoolExecutor(max_workers=max(1, len(checks))) as executor:
+            outcomes = list(executor.map(lambda check: self.check_endpoint(*check), checks))
+
+        results = {}
+        for (base_url, _), outcome in zip(checks, outcomes):
+            if not results.get(base_url, {}).get('ok'):
+                results[base_url] = outcome
+        for base_url, outcome in results.items():
+            if not outcome['ok']:
+                logger.warning("LLM endpoint %s failed warmup: %s", base_url, outcome.get('error') or outcome['status'])
+        self.last_warmup = {'pid': os.getpid(), 'endpoints': results}
+        return results
+
+    def snapshot(self):
+        """Pool limits and the last warmup outcome for the metrics endpoint"""
+        return {
+            'max_connections': self.limits.max_connections,
+            'max_keepalive_connections': self.limits.max_keepalive_connections,
+            'keepalive_expiry': self.limits.keepalive_expiry,
+            'warmup': self.last_warmup,
+        }
@@ -0,0 +1,68 @@
+"""
+Upload memory profiling for Legal Document AI Simplifier
+Measures the peak Python allocation of each upload pipeline stage with
+tracemalloc and compares it with the per-request memory budget. tracemalloc
+slows every allocation down and its peak is process-wide, so stages are
+measured one at a time and profiling is meant for diagnosis, not production.
+"""
+
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StageProfiler:
+    """Peak traced allocation per named pipeline stage"""
+
+    def __init__(self, budget, enabled=False):
+        self.budget = budget
+        self.enabled = enabled
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the block's peak allocation above what was allocated when it started"""
+        if not self.enabled:
+            yield
+            return
+
+        # Serialised because tracemalloc has a single, process-wide peak
+        with self.lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            try:
+                yield
+            finally:
+                self.record(name, tracemalloc.get_traced_memory()[1] - baseline)
+
+    def record(self, name, peak):
+        """Fold one measurement into the stage's statistics"""
+        stats = self.stages.setdefault(name, {'calls': 0, 'last_peak': 0, 'max_peak': 0})
+        stats['calls'] += 1
+        stats['last_peak'] = peak
+        stats['max_peak'] = max(stats['max_peak'], peak)
+        if peak > self.budget:
+            logger.warning("Upload stage %s peaked at %d bytes, over the %d byte budget", name, peak, self.budget)
+
+    def report(self):
+        """Per-stage peaks for the metrics endpoint"""
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'budget': self.budget,
+                'stages': {
+                    name: {**stats, 'over_budget': stats['max_peak'] > self.budget}
+                    for name, stats in self.stages.items()
+                },
+            }
+
+    def reset(self):
+        """Forget all measurements"""
+        with self.lock:
+            self.stages = {}
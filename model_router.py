@@ -0,0 +1,285 @@
+"""
+Model router for Legal Document AI Simplifier
+Holds a pool of OpenAI-compatible backends, tracks their rolling latency and
+error rates, and picks a backend for each call based on the kind of request.
+Calls can optionally be hedged: a duplicate is raced against a slow call.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque, defaultdict
+from langchain_openai import ChatOpenAI
+
+# Backend tiers: 'fast' for cheap, short calls and 'quality' for long simplifications
+FAST_TIER = 'fast'
+QUALITY_TIER = 'quality'
+
+
+class BackendStats:
+    """Rolling window of latencies and outcomes for one backend"""
+
+    def __init__(self, window, error_ttl=30.0):
+        self.latencies = deque(maxlen=window)
+        # Tasks differ in latency by an order of magnitude, so hedging compares each call with its own task
+        self.task_latencies = defaultdict(lambda: deque(maxlen=window))
+        # (time, ok) pairs; outcomes older than error_ttl no longer count, so a
+        # backend demoted for errors recovers even if it gets no new calls
+        self.outcomes = deque(maxlen=window)
+        self.error_ttl = error_ttl
+        self.calls = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency, ok, task=None):
+        """Record one call; only successful calls contribute latency samples"""
+        with self.lock:
+            self.calls += 1
+            self.outcomes.append((time.monotonic(), ok))
+            if ok:
+                self.latencies.append(latency)
+                self.task_latencies[task].append(latency)
+            else:
+                self.errors += 1
+
+    def error_rate(self):
+        """Share of failed calls among the window's outcomes from the last error_ttl seconds"""
+        cutoff = time.monotonic() - self.error_ttl
+        with self.lock:
+            recent = [ok for recorded, ok in self.outcomes if recorded >= cutoff]
+        if not recent:
+            return 0.0
+        return recent.count(False) / len(recent)
+
+    def percentile(self, q, task=None):
+        """Latency percentile (0-100) over the window, or over one task's window, or None without samples"""
+        with self.lock:
+            samples = sorted(self.latencies if task is None else self.task_latencies.get(task, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+    def snapshot(self):
+        """Counters and latency percentiles for the metrics endpoint"""
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'error_rate': round(self.error_rate(), 3),
+            'p50_latency': self.percentile(50),
+            'p95_latency': self.percentile(95),
+            'p95_latency_by_task': {task or 'default': self.percentile(95, task) for task in list(self.task_latencies)},
+        }
+
+
+class Backend:
+    """One configured OpenAI-compatible endpoint"""
+
+    def __init__(self, name, tier, model, client, window, error_ttl=30.0):
+        self.name = name
+        self.tier = tier
+        self.model = model
+        self.client = client
+        self.stats = BackendStats(window, error_ttl)
+
+
+def build_chat_model(spec, temperature, http_client=None, timeout=None):
+    """Create a chat client for a backend spec from Config.get_model_backends()"""
+    return ChatOpenAI(
+        model=spec['model'],
+        temperature=spec.get('temperature', temperature),
+        api_key=spec.get('api_key'),
+        base_url=spec.get('base_url'),
+        http_client=http_client,
+        timeout=timeout
+    )
+
+
+class ModelRouter:
+    """Dispatches LLM calls across backends with latency-aware ordering, hedging and failover"""
+
+    def __init__(self, backends, short_prompt_chars, max_error_rate, hedging=False, hedge_percentile=95,
+                 hedge_min_delay=0.25, hedge_default_delay=2.0, hedge_max_ratio=0.1, hedge_workers=32,
+                 ledger=None, usage_context=None):
+        self.backends = backends
+        self.short_prompt_chars = short_prompt_chars
+        self.max_error_rate = max_error_rate
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_max_ratio = hedge_max_ratio
+        self.hedge_workers = hedge_workers
+        # Optional UsageLedger, plus a callable giving the route and client of the current request
+        self.ledger = ledger
+        self.usage_context = usage_context
+        self.decisions = defaultdict(lambda: defaultdict(int))
+        self.calls = 0
+        self.failovers = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+    @classmethod
+    def from_config(cls, config, ledger=None, usage_context=None, http_client=None, timeout=None):
+        """Build a router for every backend in the configuration, optionally sharing one HTTP client"""
+        backends = [
+            Backend(spec['name'], spec.get('tier', QUALITY_TIER), spec['model'],
+                    build_chat_model(spec, config.OPENAI_TEMPERATURE, http_client, timeout), config.ROUTER_STATS_WINDOW,
+                    config.ROUTER_ERROR_TTL)
+            for spec in config.get_model_backends()
+        ]
+        return cls(
+            backends,
+            config.ROUTER_SHORT_PROMPT_CHARS,
+            config.ROUTER_MAX_ERROR_RATE,
+            hedging=config.HEDGE_REQUESTS,
+            hedge_percentile=config.HEDGE_PERCENTILE,
+            hedge_min_delay=config.HEDGE_MIN_DELAY,
+            hedge_default_delay=config.HEDGE_DEFAULT_DELAY,
+            hedge_max_ratio=config.HEDGE_MAX_RATIO,
+            hedge_workers=config.HEDGE_WORKERS,
+            ledger=ledger,
+            usage_context=usage_context
+        )
+
+    def choose_tier(self, messages, task=None):
+        """Short calls and term explanations go to the fast tier, long ones to quality"""
+        if task == 'explain':
+            return FAST_TIER
+        prompt_chars = sum(len(message.content) for message in messages)
+        return FAST_TIER if prompt_chars <= self.short_prompt_chars else QUALITY_TIER
+
+    def candidates(self, tier):
+        """Backends in the order they should be tried for a tier"""
+        def score(backend):
+            unhealthy = backend.stats.error_rate() > self.max_error_rate
+            # Untried backends sort first so they get latency samples
+            return (unhealthy, backend.tier != tier, backend.stats.percentile(50) or 0.0)
+        return sorted(self.backends, key=score)
+
+    def invoke(self, messages, task=None):
+        """Send messages to the best backend, failing over to the next on errors"""
+        with self.lock:
+            self.calls += 1
+        candidates = self.candidates(self.choose_tier(messages, task))
+        # Captured here because hedged calls run on pool threads outside the request
+        usage = {'task': task, 'cache_status': 'miss', **(self.usage_context() if self.usage_context else {})}
+        failed = []
+        last_error = None
+        for index, backend in enumerate(candidates):
+            if backend in failed:
+                continue
+            if last_error is not None:
+                with self.lock:
+                    self.failovers += 1
+            attempt = 'failover' if failed else 'primary'
+            try:
+                if self.hedging:
+                    # Hedge onto the next untried backend, or the same one if it is the last
+                    spare = next((other for other in candidates[index + 1:] if other not in failed), backend)
+                    backend, response = self.invoke_hedged(backend, spare, messages, failed, usage, attempt, task)
+                else:
+                    response = self.call(backend, messages, usage, attempt)
+            except Exception as e:
+                if backend not in failed:
+                    failed.append(backend)
+                last_error = e
+                continue
+            with self.lock:
+                self.decisions[task or 'default'][backend.name] += 1
+            return response
+        raise last_error or RuntimeError("No model backends configured")
+
+    def call(self, backend, messages, usage=None, attempt='primary'):
+        """Invoke one backend and record its latency, outcome and token usage"""
+        start = time.monotonic()
+        try:
+            response = backend.client.invoke(messages)
+        except Exception:
+            self.record(backend, None, time.monotonic() - start, 'error', usage, attempt)
+            raise
+        self.record(backend, response, time.monotonic() - start, 'ok', usage, attempt)
+        return response
+
+    def record(self, backend, response, latency, status, usage, attempt):
+        """Feed a finished call into the backend's stats and the usage ledger"""
+        backend.stats.record(latency, ok=status == 'ok', task=(usage or {}).get('task'))
+        if self.ledger is not None:
+            self.ledger.record(response, latency, status, model=backend.model, backend=backend.name,
+                               attempt=attempt, **(usage or {}))
+
+    def invoke_hedged(self, backend, spare, messages, failed, usage=None, attempt='primary', task=None):
+        """Call a backend and, if it misses its hedge deadline, race a duplicate on the spare"""
+        executor = self.executor()
+        primary = executor.submit(self.call, backend, messages, usage, attempt)
+        futures = {primary: backend}
+        done, _ = wait([primary], timeout=self.hedge_delay(backend, task))
+        hedge = None
+        if not done and self.take_hedge():
+            hedge = executor.submit(self.call, spare, messages, usage, 'hedge')
+            futures[hedge] = spare
+
+        last_error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    last_error = future.exception()
+                    if futures[future] not in failed:
+                        failed.append(futures[future])
+                    continue
+                # The loser cannot be interrupted mid-request; cancelling drops it if it has not started
+                for loser in pending:
+                    loser.cancel()
+                if future is hedge:
+                    with self.lock:
+                        self.hedges_won += 1
+                return futures[future], future.result()
+        raise last_error
+
+    def hedge_delay(self, backend, task=None):
+        """Seconds to wait before hedging: the backend's latency percentile for the task, with a floor"""
+        latency = backend.stats.percentile(self.hedge_percentile, task)
+        if latency is None:
+            return self.hedge_default_delay
+        return max(latency, self.hedge_min_delay)
+
+    def take_hedge(self):
+        """Spend one hedge unless hedges already reach the configured share of calls"""
+        with self.lock:
+            if self.hedges_fired >= self.hedge_max_ratio * self.calls:
+                return False
+            self.hedges_fired += 1
+            return True
+
+    def executor(self):
+        """Thread pool for hedged calls, created lazily so each forked worker gets its own"""
+        with self.lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix='hedge')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def metrics(self):
+        """Routing decisions, hedging counters and per-backend health for the metrics endpoint"""
+        with self.lock:
+            decisions = {task: dict(counts) for task, counts in self.decisions.items()}
+            counters = {
+                'calls': self.calls,
+                'failovers': self.failovers,
+                'hedges_fired': self.hedges_fired,
+                'hedges_won': self.hedges_won,
+            }
+        return {
+            'backends': {
+                backend.name: {'tier': backend.tier, 'model': backend.model, **backend.stats.snapshot()}
+                for backend in self.backends
+            },
+            'decisions': decisions,
+            'hedging': self.hedging,
+            **counters,
+        }
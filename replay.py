@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+Traffic replay for Legal Document AI Simplifier
+Replays a recorded traffic log (see traffic.py) against the production server
+backed by a local mock LLM, then reports throughput, latency percentiles,
+error rates and the RSS and CPU time of every server process:
+
+    python replay.py traffic.jsonl --speed 2 --workers 4 --llm-latency 0.8
+
+By default the server is started from serve.py on a free port; pass --target
+to replay against one that is already running (and --server-pid to sample it).
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import docx
+from PyPDF2 import PdfWriter, PageObject
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+from traffic import load_traffic
+
+REPLAY_ROUTES = ('/upload', '/simplify', '/explain', '/summarize')
+
+# The replayer is a single client, so per-client admission limits would throttle it long before
+# the server reached capacity; only the global limits are left to shed load
+PER_CLIENT_LIMIT = str(10 ** 9)
+
+UPLOAD_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'txt': 'text/plain',
+}
+
+# Characters of text on each line and page of a synthesised PDF
+PDF_LINE_CHARS = 90
+PDF_LINES_PER_PAGE = 40
+
+FILLER = ("The Lessee shall indemnify and hold harmless the Lessor from any claims arising out of "
+          "the use of the Premises, notwithstanding any provision herein to the contrary. ")
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible endpoint that answers after a fixed latency plus jitter"""
+
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    jitter = 0.0
+
+    def do_GET(self):
+        self.reply({'object': 'list', 'data': [{'id': 'mock-model', 'object': 'model'}]})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        prompt_tokens = sum(len(str(message.get('content', ''))) for message in request.get('messages', [])) // 4
+        self.reply({
+            'id': 'chatcmpl-replay',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock-model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': 'Mock response.'}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 3, 'total_tokens': prompt_tokens + 3},
+        })
+
+    def reply(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_mock_llm(latency=0.0, jitter=0.0, port=0):
+    """Serve the mock LLM on a background thread; its base URL is http://127.0.0.1:<port>/v1"""
+    handler = type('ConfiguredMockLLMHandler', (MockLLMHandler,), {'latency': latency, 'jitter': jitter})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='mock-llm', daemon=True).start()
+    return server
+
+
+def free_port():
+    """An unused local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, llm_url, workers, threads, env=None):
+    """Launch serve.py against the mock LLM and wait until it reports healthy"""
+    state = tempfile.mkdtemp(prefix='replay-')
+    server_env = {
+        **os.environ,
+        'HOST': '127.0.0.1',
+        'PORT': str(port),
+        'SERVER_WORKERS': str(workers),
+        'SERVER_THREADS': str(threads),
+        'OPENAI_API_KEY': 'replay',
+        'OPENAI_API_BASE_URL': llm_url,
+        'OPENAI_BACKENDS': '',
+        'TRAFFIC_RECORDING': 'False',
+        'UPLOAD_FOLDER': os.path.join(state, 'uploads'),
+        'USAGE_LEDGER_PATH': os.path.join(state, 'usage.sqlite3'),
+        'ADMISSION_STATE_PATH': os.path.join(state, 'admission.sqlite3'),
+        'ADMISSION_MAX_CONCURRENT_PER_CLIENT': PER_CLIENT_LIMIT,
+        'ADMISSION_MAX_TOKENS_PER_CLIENT': PER_CLIENT_LIMIT,
+        **(env or {}),
+    }
+    process = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py')],
+                               env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/health', timeout=1).status_code in (200, 503):
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not become healthy within 60 seconds")
+
+
+def filler_text(size):
+    """Legal-sounding text of roughly the given number of characters"""
+    return (FILLER * (size // len(FILLER) + 1))[:max(size, 1)]
+
+
+def varied_text(size, seed=0):
+    """Filler words in a shuffled order, which compresses about as well as real prose"""
+    words = FILLER.split()
+    rng = random.Random(seed)
+    pieces, length = [], 0
+    while length < size:
+        word = rng.choice(words)
+        pieces.append(word)
+        length += len(word) + 1
+    return ' '.join(pieces)[:max(size, 1)]
+
+
+def fit_size(render, size):
+    """Render a document from text of the given length, then once more with the length scaled to hit size bytes"""
+    # A document with no text still has a fixed overhead, and the text may be compressed or framed
+    empty = len(render(0))
+    data = render(size)
+    if empty < size:
+        data = render(size * (size - empty) // max(len(data) - empty, 1))
+    return data
+
+
+def render_pdf(length):
+    """A text PDF carrying the given number of characters"""
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+    }))
+    text = filler_text(length) if length else ''
+    page_chars = PDF_LINE_CHARS * PDF_LINES_PER_PAGE
+    for offset in range(0, len(text), page_chars):
+        page_text = text[offset:offset + page_chars]
+        page = PageObject.create_blank_page(width=612, height=792)
+        content = DecodedStreamObject()
+        content.set_data(''.join(
+            f"BT /F1 10 Tf 40 {760 - 18 * line} Td ({page_text[start:start + PDF_LINE_CHARS]}) Tj ET\n"
+            for line, start in enumerate(range(0, len(page_text), PDF_LINE_CHARS))
+        ).encode())
+        page[NameObject('/Contents')] = writer._add_object(content)
+        page[NameObject('/Resources')] = DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/F1'): font})
+        })
+        writer.add_page(page)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def render_docx(length):
+    """A DOCX carrying the given number of characters in paragraphs of up to 1000"""
+    document = docx.Document()
+    for offset in range(0, length, 1000):
+        document.add_paragraph(varied_text(min(1000, length - offset), seed=offset))
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+def build_upload(upload_type, size):
+    """Filename, content and content type of a synthesised upload of the recorded type and size"""
+    if upload_type == 'pdf':
+        return 'replay.pdf', fit_size(render_pdf, size), UPLOAD_TYPES['pdf']
+    if upload_type == 'docx':
+        return 'replay.docx', fit_size(render_docx, size), UPLOAD_TYPES['docx']
+    return 'replay.txt', filler_text(size).encode(), UPLOAD_TYPES['txt']
+
+
+def build_request(entry):
+    """Method, route and httpx arguments for a request of the recorded size and upload type"""
+    size = entry.get('request_bytes', 0)
+    route = entry['route']
+    if route == '/upload':
+        upload_type = (entry.get('upload_types') or ['txt'])[0]
+        # Leave room for the multipart framing around the file
+        return 'POST', route, {'files': {'file': build_upload(upload_type, size - 200)}}
+    if route == '/explain':
+        return 'POST', route, {'json': {'term': 'indemnify'}}
+    return 'POST', route, {'json': {'text': filler_text(size - 12)}}
+
+
+def schedule(entries, speed=1.0, rate=None):
+    """Send offsets in seconds: recorded inter-arrival times divided by speed, or a fixed rate"""
+    if not entries:
+        return []
+    if rate:
+        return [(index / rate, entry) for index, entry in enumerate(entries)]
+    first = entries[0]['ts']
+    return [((entry['ts'] - first) / speed, entry) for entry in entries]
+
+
+def send(client, entry, scheduled_at):
+    """Issue one request; latency counts from its scheduled time so a backlog shows up as latency"""
+    method, route, arguments = build_request(entry)
+    result = {'route': route}
+    try:
+        response = client.request(method, route, **arguments)
+        result['status'] = response.status_code
+    except httpx.HTTPError as e:
+        result['status'] = None
+        result['error'] = type(e).__name__
+    result['latency'] = time.monotonic() - scheduled_at
+    return result
+
+
+def replay(entries, target, speed=1.0, rate=None, concurrency=64, timeout=120):
+    """Replay requests open-loop against a server and return one result per request"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    with httpx.Client(base_url=target, limits=limits, timeout=timeout) as client, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.monotonic()
+        futures = []
+        for offset, entry in schedule(entries, speed, rate):
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(send, client, entry, start + offset))
+        return [future.result() for future in futures]
+
+
+def process_tree(root_pid):
+    """The root process and all of its descendants"""
+    parents = {}
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            try:
+                with open(f'/proc/{name}/stat') as file:
+                    parents[int(name)] = int(file.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    tree = [root_pid]
+    for pid in tree:
+        tree.extend(child for child, parent in parents.items() if parent == pid)
+    return tree
+
+
+def read_process(pid):
+    """Resident memory in bytes and CPU seconds used so far, from /proc"""
+    with open(f'/proc/{pid}/stat') as file:
+        fields = file.read().rsplit(')', 1)[1].split()
+    with open(f'/proc/{pid}/statm') as file:
+        resident_pages = int(file.read().split()[1])
+    # utime and stime are fields 14 and 15 of stat, counted from the state field after the name
+    return resident_pages * PAGE_SIZE, (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+class ProcessSampler:
+    """Samples RSS and CPU time of a server and its workers on a background thread"""
+
+    def __init__(self, root_pid, interval=0.5):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.processes = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='process-sampler', daemon=True)
+
+    def start(self):
+        self.started = time.monotonic()
+        self.sample()
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        for pid in process_tree(self.root_pid):
+            try:
+                rss, cpu = read_process(pid)
+            except (OSError, IndexError, ValueError):
+                continue
+            stats = self.processes.setdefault(pid, {'first_cpu': cpu, 'peak_rss': 0})
+            stats['cpu'] = cpu
+            stats['rss'] = rss
+            stats['peak_rss'] = max(stats['peak_rss'], rss)
+
+    def stop(self):
+        """Stop sampling and return per-process peak RSS, CPU seconds and CPU share"""
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+        elapsed = time.monotonic() - self.started
+        return {
+            pid: {
+                'role': 'master' if pid == self.root_pid else 'worker',
+                'peak_rss_mb': round(stats['peak_rss'] / (1024 * 1024), 1),
+                'rss_mb': round(stats['rss'] / (1024 * 1024), 1),
+                'cpu_seconds': round(stats['cpu'] - stats['first_cpu'], 2),
+                'cpu_percent': round(100 * (stats['cpu'] - stats['first_cpu']) / elapsed, 1) if elapsed else 0.0,
+            }
+            for pid, stats in sorted(self.processes.items())
+        }
+
+
+def percentile(samples, q):
+    """Latency percentile (0-100) of a sorted list"""
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+
+def summarize(results, elapsed):
+    """Throughput, error rates and latency percentiles, overall and per route"""
+    def stats(group):
+        latencies = sorted(result['latency'] for result in group)
+        errors = sum(1 for result in group if result['status'] is None or result['status'] >= 400)
+        statuses = {}
+        for result in group:
+            status = str(result['status'] or result.get('error'))
+            statuses[status] = statuses.get(status, 0) + 1
+        return {
+            'requests': len(group),
+            'errors': errors,
+            'error_rate': round(errors / len(group), 3) if group else 0.0,
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else None,
+            'statuses': statuses,
+        }
+
+    routes = {}
+    for result in results:
+        routes.setdefault(result['route'], []).append(result)
+    return {
+        'elapsed': round(elapsed, 3),
+        'throughput': round(len(results) / elapsed, 2) if elapsed else 0.0,
+        **stats(results),
+        'routes': {route: stats(group) for route, group in sorted(routes.items())},
+    }
+
+
+def print_report(summary, processes):
+    """Human-readable report of a replay"""
+    def seconds(value):
+        return '-' if value is None else f'{value:.3f}s'
+
+    print(f"{summary['requests']} requests in {summary['elapsed']}s: {summary['throughput']} req/s, "
+          f"error rate {summary['error_rate']:.1%}")
+    print(f"{'route':<12} {'requests':>8} {'errors':>7} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}  statuses")
+    for route, stats in [*summary['routes'].items(), ('all', summary)]:
+        print(f"{route:<12} {stats['requests']:>8} {stats['errors']:>7} {seconds(stats['p50']):>8} "
+              f"{seconds(stats['p90']):>8} {seconds(stats['p99']):>8} {seconds(stats['max']):>8}  {stats['statuses']}")
+    if processes:
+        print(f"\n{'pid':>8} {'role':<7} {'peak rss':>10} {'rss':>10} {'cpu':>8} {'cpu %':>7}")
+        for pid, stats in processes.items():
+            print(f"{pid:>8} {stats['role']:<7} {stats['peak_rss_mb']:>8}MB {stats['rss_mb']:>8}MB "
+                  f"{stats['cpu_seconds']:>7}s {stats['cpu_percent']:>6}%")
+
+
+def main(argv=None):
+    """Replay a traffic log from the command line"""
+    from config import get_config
+
+    parser = argparse.ArgumentParser(description="Replay recorded traffic against the server and a mock LLM")
+    parser.add_argument('traffic', nargs='?', default=get_config().TRAFFIC_LOG_PATH, help="Traffic log from TRAFFIC_RECORDING")
+    parser.add_argument('--speed', type=float, default=1.0, help="Replay this many times faster than recorded")
+    parser.add_argument('--rate', type=float, help="Send at a fixed rate in requests per second instead")
+    parser.add_argument('--limit', type=int, help="Replay only the first N requests")
+    parser.add_argument('--concurrency', type=int, default=64, help="Most requests in flight from the replayer")
+    parser.add_argument('--target', help="URL of an already running server, e.g. http://127.0.0.1:5000")
+    parser.add_argument('--server-pid', type=int, help="Master pid of the --target server, for resource sampling")
+    parser.add_argument('--workers', type=int, default=2, help="Workers for the started server")
+    parser.add_argument('--threads', type=int, default=4, help="Threads per worker for the started server")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE', help="Extra setting for the started server")
+    parser.add_argument('--llm-latency', type=float, default=0.5, help="Seconds the mock LLM takes per call")
+    parser.add_argument('--llm-jitter', type=float, default=0.2, help="Extra random seconds per mock LLM call")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    entries = load_traffic(args.traffic, REPLAY_ROUTES)[:args.limit]
+    if not entries:
+        print(f"No {', '.join(REPLAY_ROUTES)} requests in {args.traffic}")
+        return 1
+
+    mock_llm = start_mock_llm(args.llm_latency, args.llm_jitter)
+    server = None
+    target, server_pid = args.target, args.server_pid
+    if target is None:
+        port = free_port()
+        llm_url = f'http://127.0.0.1:{mock_llm.server_address[1]}/v1'
+        server = start_server(port, llm_url, args.workers, args.threads, dict(item.split('=', 1) for item in args.env))
+        target, server_pid = f'http://127.0.0.1:{port}', server.pid
+    elif server_pid is None:
+        print(f"Replaying against {target}; point its OPENAI_API_BASE_URL at "
+              f"http://127.0.0.1:{mock_llm.server_address[1]}/v1 to use the mock LLM", file=sys.stderr)
+
+    sampler = ProcessSampler(server_pid).start() if server_pid else None
+    try:
+        start = time.monotonic()
+        results = replay(entries, target, args.speed, args.rate, args.concurrency)
+        elapsed = time.monotonic() - start
+    finally:
+        processes = sampler.stop() if sampler else {}
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        mock_llm.shutdown()
+
+    summary = summarize(results, elapsed)
+    if args.json:
+        print(json.dumps({**summary, 'processes': processes}, indent=2))
+    else:
+        print_report(summary, processes)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
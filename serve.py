@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Production server for Legal Document AI Simplifier
+Runs the Flask app under gunicorn with preforked workers. The app, document
+parsers and compiled term patterns are loaded once in the master process so
+the workers share them copy-on-write.
+"""
+
+import gc
+from gunicorn.app.base import BaseApplication
+from app import app, config, preload, warm_up_llm_clients
+
+
+class ProductionServer(BaseApplication):
+    """Gunicorn application that serves an already-imported Flask app"""
+
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def server_options(config):
+    """Gunicorn settings derived from the application configuration"""
+    return {
+        'bind': f"{config.HOST}:{config.PORT}",
+        'workers': config.SERVER_WORKERS,
+        # Threaded workers cap concurrent requests per worker at SERVER_THREADS
+        'worker_class': 'gthread',
+        'threads': config.SERVER_THREADS,
+        # Recycling workers bounds memory growth from PDF parsing
+        'max_requests': config.SERVER_MAX_REQUESTS,
+        'max_requests_jitter': config.SERVER_MAX_REQUESTS_JITTER,
+        'timeout': config.SERVER_TIMEOUT,
+        'preload_app': True,
+        # Connections are per process, so each worker warms its own after the fork
+        'post_worker_init': lambda worker: warm_up_llm_clients(),
+    }
+
+
+def main():
+    """Preload shared state, then fork the workers"""
+    preload()
+    # Move everything loaded so far out of the collector's reach so that
+    # collections in the workers do not touch, and copy, the shared pages
+    gc.freeze()
+    ProductionServer(app, server_options(config)).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -56,12 +56,13 @@ echo "🚀 Starting the application..."
 echo ""
 echo "Choose your interface:"
 echo "1. Flask Web App (http://localhost:5000)"
-echo "2. Streamlit App (http://localhost:8501)"
-echo "3. Run tests"
-echo "4. Exit"
+echo "2. Flask Production Server (http://localhost:5000)"
+echo "3. Streamlit App (http://localhost:8501)"
+echo "4. Run tests"
+echo "5. Exit"
 echo ""
 
-read -p "Enter your choice (1-4): " choice
+read -p "Enter your choice (1-5): " choice
 
 case $choice in
     1)
@@ -71,16 +72,23 @@ case $choice in
         python app.py
         ;;
     2)
+        echo "🏭 Starting Flask production server..."
+        echo "Workers: ${SERVER_WORKERS:-auto}, threads per worker: ${SERVER_THREADS:-4}"
+        echo "Open your browser and go to: http://localhost:5000"
+        echo "Press Ctrl+C to stop the server"
+        python serve.py
+        ;;
+    3)
         echo "📊 Starting Streamlit application..."
         echo "Open your browser and go to: http://localhost:8501"
         echo "Press Ctrl+C to stop the server"
         streamlit run streamlit_app.py
         ;;
-    3)
+    4)
         echo "🧪 Running tests..."
         python test_app.py
         ;;
-    4)
+    5)
         echo "👋 Goodbye!"
         exit 0
         ;;
@@ -1,5 +1,21 @@
 // Global variables
 let currentResults = null;
+let originalViewer = null;
+
+// Pages further than this from the viewport are swapped for fixed-height placeholders
+const ORIGINAL_VIEWER_MARGIN = '1500px';
+
+// Term detection runs in a Web Worker; typing is debounced before text is sent to it
+const TERM_WORKER_URL = '/static/js/term-worker.js';
+const TERM_DETECTION_DELAY = 300;
+const MAX_DOCUMENT_TERMS = 20;
+const termDetector = { ready: null, worker: null, nextId: 0, jobs: {} };
+let textTerms = { text: null, id: null, promise: null };
+let documentTerms = null;
+
+// Explanations are cached in IndexedDB so repeat lookups skip the network across sessions
+const EXPLANATION_CACHE_TTL = 7 * 24 * 60 * 60 * 1000;
+let explanationDb = null;
 
 // DOM elements
 const uploadArea = document.getElementById('uploadArea');
@@ -13,6 +29,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeDragAndDrop();
     initializeFileInput();
     initializeTabs();
+    initializeTermDetection();
 });
 
 // Drag and Drop functionality
@@ -117,7 +134,7 @@ function showResults(data) {
     // Update content
     document.getElementById('summaryContent').textContent = data.summary;
     document.getElementById('simplifiedContent').textContent = data.simplified_text;
-    document.getElementById('originalContent').textContent = data.original_text;
+    loadOriginalText(data.document_id);
     
     // Show results section
     resultsSection.style.display = 'block';
@@ -126,6 +143,123 @@ function showResults(data) {
     resultsSection.scrollIntoView({ behavior: 'smooth' });
 }
 
+// Original text viewer: pages are fetched on demand and only pages near the viewport stay rendered
+function loadOriginalText(documentId) {
+    const container = document.getElementById('originalContent');
+    if (originalViewer) {
+        originalViewer.loadObserver.disconnect();
+        originalViewer.pageObserver.disconnect();
+    }
+    container.innerHTML = '';
+    resetDocumentTerms();
+
+    const sentinel = document.createElement('div');
+    sentinel.className = 'original-sentinel';
+    container.appendChild(sentinel);
+
+    originalViewer = {
+        documentId: documentId,
+        container: container,
+        sentinel: sentinel,
+        nextPage: 0,
+        hasMore: true,
+        loading: false,
+        pages: [],
+        loadObserver: new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextOriginalPage();
+            }
+        }, { root: container, rootMargin: '400px' }),
+        pageObserver: new IntersectionObserver(entries => {
+            entries.forEach(entry => toggleOriginalPage(entry.target, entry.isIntersecting));
+        }, { root: container, rootMargin: ORIGINAL_VIEWER_MARGIN })
+    };
+    originalViewer.loadObserver.observe(sentinel);
+
+    // Load the first page straight away so its key terms show before the tab is opened
+    loadNextOriginalPage();
+}
+
+// Fetch the next page of original text from the document store
+function loadNextOriginalPage() {
+    const viewer = originalViewer;
+    if (!viewer || viewer.loading || !viewer.hasMore) {
+        return;
+    }
+    viewer.loading = true;
+
+    fetch(`/documents/${viewer.documentId}/text?page=${viewer.nextPage}`)
+    .then(response => response.json().then(data => ({ status: response.status, data: data })))
+    .then(({ status, data }) => {
+        if (viewer !== originalViewer) {
+            return;
+        }
+        viewer.loading = false;
+        if (!data.success) {
+            viewer.hasMore = false;
+            showNotification(data.error || 'Original text is no longer available', 'warning');
+            return;
+        }
+        if (status === 202) {
+            // Page is still being extracted on the server
+            setTimeout(loadNextOriginalPage, 500);
+            return;
+        }
+
+        if (data.text) {
+            appendOriginalPage(viewer, data.text);
+        }
+        viewer.nextPage += 1;
+        viewer.hasMore = data.has_more;
+        if (!viewer.hasMore) {
+            viewer.loadObserver.disconnect();
+            viewer.sentinel.remove();
+            if (data.failed) {
+                showNotification('Part of this document could not be read, so the original text is incomplete', 'warning');
+            } else if (data.truncated) {
+                showNotification('This document is longer than the server stores, so only its beginning is shown', 'warning');
+            }
+        } else {
+            // Re-observing reports the sentinel's current state, so a short page loads the next one
+            viewer.loadObserver.unobserve(viewer.sentinel);
+            viewer.loadObserver.observe(viewer.sentinel);
+        }
+    })
+    .catch(error => {
+        viewer.loading = false;
+        console.error('Error:', error);
+    });
+}
+
+// Render a page and let the observer virtualize it once it scrolls away
+function appendOriginalPage(viewer, text) {
+    const page = document.createElement('div');
+    page.className = 'original-page';
+    page.dataset.page = viewer.pages.length;
+    page.textContent = text;
+    viewer.pages.push(text);
+    viewer.container.insertBefore(page, viewer.sentinel);
+    viewer.pageObserver.observe(page);
+
+    const terms = documentTerms;
+    detectLegalTerms(text, found => addDocumentTerms(terms, found), Array.from(terms.seen));
+}
+
+// Swap a page between its text and an empty placeholder of the same height
+function toggleOriginalPage(page, visible) {
+    const text = originalViewer.pages[page.dataset.page];
+    if (visible && page.classList.contains('virtualized')) {
+        page.classList.remove('virtualized');
+        page.style.height = '';
+        page.textContent = text;
+    } else if (!visible && page.offsetParent !== null && !page.classList.contains('virtualized')) {
+        // Pages in a hidden tab have no height to preserve, so they are left alone
+        page.style.height = `${page.offsetHeight}px`;
+        page.classList.add('virtualized');
+        page.textContent = '';
+    }
+}
+
 // Tab functionality
 function initializeTabs() {
     const tabBtns = document.querySelectorAll('.tab-btn');
@@ -188,41 +322,151 @@ function explainTerms() {
         return;
     }
 
-    // Extract potential legal terms (simple approach)
-    const legalTerms = extractLegalTerms(text);
-    
-    if (legalTerms.length === 0) {
-        showNotification('No legal terms found in the text', 'info');
-        return;
-    }
+    // Usually already detected by the debounced input handler
+    termsForText(text).then(legalTerms => {
+        if (legalTerms.length === 0) {
+            showNotification('No legal terms found in the text', 'info');
+            return;
+        }
 
-    // Show terms for user to select
-    showTermsSelectionModal(legalTerms);
+        // Show terms for user to select
+        showTermsSelectionModal(legalTerms.slice(0, 10)); // Limit to 10 terms
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showNotification('Error detecting legal terms. Please try again.', 'error');
+    });
 }
 
-// Extract potential legal terms from text
-function extractLegalTerms(text) {
-    // Simple regex to find potential legal terms (capitalized words, common legal phrases)
-    const legalPatterns = [
-        /\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b/g, // Capitalized phrases
-        /\b(?:hereby|whereas|hereinafter|aforesaid|pursuant|whereby|notwithstanding)\b/gi,
-        /\b(?:party|parties|agreement|contract|terms|conditions|liability|damages|breach|termination)\b/gi
-    ];
-    
-    const terms = new Set();
-    
-    legalPatterns.forEach(pattern => {
-        const matches = text.match(pattern);
-        if (matches) {
-            matches.forEach(match => {
-                if (match.length > 3) { // Filter out very short matches
-                    terms.add(match.toLowerCase());
+// Detect terms while the user types, once typing pauses
+function initializeTermDetection() {
+    let timer = null;
+    textInput.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+            const text = textInput.value.trim();
+            if (text) {
+                termsForText(text);
+            }
+        }, TERM_DETECTION_DELAY);
+    });
+}
+
+// Terms for the textarea text, reusing the last detection when the text is unchanged
+function termsForText(text) {
+    if (textTerms.text !== text) {
+        if (textTerms.id !== null && termDetector.jobs[textTerms.id]) {
+            termDetector.worker.postMessage({ type: 'cancel', id: textTerms.id });
+        }
+        const terms = { text: text, id: null, promise: null };
+        terms.promise = detectLegalTerms(text, null, [], id => { terms.id = id; })
+            .catch(error => {
+                // Forget a failed detection so asking again for the same text retries it
+                if (textTerms === terms) {
+                    textTerms = { text: null, id: null, promise: null };
                 }
+                throw error;
             });
+        textTerms = terms;
+    }
+    return textTerms.promise;
+}
+
+// Start the worker and hand it the server's precompiled pattern set
+function getTermWorker() {
+    if (!termDetector.ready) {
+        termDetector.worker = new Worker(TERM_WORKER_URL);
+        termDetector.worker.addEventListener('message', handleTermWorkerMessage);
+        termDetector.ready = fetch('/term-patterns')
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Term patterns unavailable (${response.status})`);
+                }
+                return response.json();
+            })
+            .then(data => {
+                termDetector.worker.postMessage({ type: 'init', patterns: data.patterns });
+                return termDetector.worker;
+            })
+            .catch(error => {
+                // Start over on the next detection rather than keeping the failure
+                termDetector.worker.terminate();
+                termDetector.worker = null;
+                termDetector.ready = null;
+                throw error;
+            });
+    }
+    return termDetector.ready;
+}
+
+// Detect legal terms in the worker; onTerms receives each chunk's new terms and the promise resolves with all of them
+function detectLegalTerms(text, onTerms, known, onStart) {
+    return getTermWorker().then(worker => new Promise(resolve => {
+        const id = ++termDetector.nextId;
+        termDetector.jobs[id] = { terms: [], onTerms: onTerms, resolve: resolve };
+        if (onStart) {
+            onStart(id);
+        }
+        worker.postMessage({ type: 'detect', id: id, text: text, known: known });
+    }));
+}
+
+// Collect chunked results from the worker
+function handleTermWorkerMessage(e) {
+    const message = e.data;
+    const job = termDetector.jobs[message.id];
+    if (!job) {
+        return;
+    }
+
+    job.terms.push(...message.terms);
+    if (job.onTerms && message.terms.length > 0) {
+        job.onTerms(message.terms);
+    }
+    if (message.done) {
+        delete termDetector.jobs[message.id];
+        job.resolve(job.terms);
+    }
+}
+
+// Clear the key term chips for a new document
+function resetDocumentTerms() {
+    documentTerms = { seen: new Set(), pending: [], frame: null };
+    document.getElementById('documentTerms').innerHTML = '';
+}
+
+// Queue newly found document terms and render them on the next frame
+function addDocumentTerms(terms, found) {
+    if (terms !== documentTerms) {
+        return;
+    }
+    found.forEach(term => {
+        if (!terms.seen.has(term)) {
+            terms.seen.add(term);
+            terms.pending.push(term);
         }
     });
-    
-    return Array.from(terms).slice(0, 10); // Limit to 10 terms
+    if (!terms.frame) {
+        terms.frame = requestAnimationFrame(() => renderDocumentTerms(terms));
+    }
+}
+
+// Render queued term chips, up to MAX_DOCUMENT_TERMS
+function renderDocumentTerms(terms) {
+    terms.frame = null;
+    const container = document.getElementById('documentTerms');
+    const fragment = document.createDocumentFragment();
+    terms.pending.splice(0).forEach(term => {
+        if (container.children.length + fragment.children.length >= MAX_DOCUMENT_TERMS) {
+            return;
+        }
+        const chip = document.createElement('button');
+        chip.className = 'term-btn';
+        chip.textContent = term.charAt(0).toUpperCase() + term.slice(1);
+        chip.addEventListener('click', () => explainTerm(term));
+        fragment.appendChild(chip);
+    });
+    container.appendChild(fragment);
 }
 
 // Show simplified text modal
@@ -267,28 +511,84 @@ function showTermsSelectionModal(terms) {
 
 // Explain a specific term
 function explainTerm(term) {
-    showProcessing();
-    
-    fetch('/explain', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ term: term })
-    })
-    .then(response => response.json())
-    .then(data => {
-        hideProcessing();
-        if (data.success) {
-            showTermExplanationModal(term, data.explanation);
-        } else {
-            showNotification(data.error || 'Error explaining term', 'error');
+    const key = term.trim().toLowerCase();
+    getCachedExplanation(key).then(cached => {
+        if (cached) {
+            showTermExplanationModal(term, cached);
+            return;
+        }
+
+        showProcessing();
+
+        fetch('/explain', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ term: term })
+        })
+        .then(response => response.json())
+        .then(data => {
+            hideProcessing();
+            if (data.success) {
+                // Failed explanations come back with an error status instead, so this is safe to cache
+                cacheExplanation(key, data.explanation);
+                showTermExplanationModal(term, data.explanation);
+            } else {
+                showNotification(data.error || 'Error explaining term', 'error');
+            }
+        })
+        .catch(error => {
+            hideProcessing();
+            console.error('Error:', error);
+            showNotification('Error explaining term. Please try again.', 'error');
+        });
+    });
+}
+
+// Open the explanation cache, resolving to null where IndexedDB is unavailable
+function openExplanationCache() {
+    if (!explanationDb) {
+        explanationDb = new Promise(resolve => {
+            if (!window.indexedDB) {
+                resolve(null);
+                return;
+            }
+            const request = indexedDB.open('legal-ai-cache', 1);
+            request.onupgradeneeded = () => request.result.createObjectStore('explanations', { keyPath: 'term' });
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => resolve(null);
+        });
+    }
+    return explanationDb;
+}
+
+// Look up a cached explanation that has not expired
+function getCachedExplanation(key) {
+    return openExplanationCache().then(db => new Promise(resolve => {
+        if (!db) {
+            resolve(null);
+            return;
+        }
+        const request = db.transaction('explanations').objectStore('explanations').get(key);
+        request.onsuccess = () => {
+            const entry = request.result;
+            resolve(entry && Date.now() - entry.saved < EXPLANATION_CACHE_TTL ? entry.explanation : null);
+        };
+        request.onerror = () => resolve(null);
+    }));
+}
+
+// Store an explanation for later sessions
+function cacheExplanation(key, explanation) {
+    openExplanationCache().then(db => {
+        if (db) {
+            db.transaction('explanations', 'readwrite').objectStore('explanations').put({
+                term: key,
+                explanation: explanation,
+                saved: Date.now()
+            });
         }
-    })
-    .catch(error => {
-        hideProcessing();
-        console.error('Error:', error);
-        showNotification('Error explaining term. Please try again.', 'error');
     });
 }
 
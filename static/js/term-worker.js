@@ -0,0 +1,72 @@
+// Legal term detection, run off the main thread
+// Patterns come from /term-patterns and are compiled once; each job's text is
+// scanned in chunks and new terms are posted back after every chunk
+
+const CHUNK_SIZE = 50000;
+const MIN_TERM_LENGTH = 4;
+
+let patterns = [];
+const jobs = [];
+let scanning = false;
+
+self.addEventListener('message', function(e) {
+    const message = e.data;
+    if (message.type === 'init') {
+        patterns = message.patterns.map(pattern => new RegExp(pattern.source, pattern.flags));
+    } else if (message.type === 'detect') {
+        jobs.push({ id: message.id, text: message.text, offset: 0, seen: new Set(message.known || []) });
+        if (!scanning) {
+            scanning = true;
+            setTimeout(scanNextChunk, 0);
+        }
+    } else if (message.type === 'cancel') {
+        const index = jobs.findIndex(job => job.id === message.id);
+        if (index !== -1) {
+            jobs.splice(index, 1);
+            self.postMessage({ type: 'terms', id: message.id, terms: [], done: true });
+        }
+    }
+});
+
+// Scan one chunk of the oldest job, then yield so cancels and new jobs are picked up
+function scanNextChunk() {
+    const job = jobs[0];
+    if (!job) {
+        scanning = false;
+        return;
+    }
+
+    const chunk = nextChunk(job.text, job.offset);
+    job.offset += chunk.length;
+
+    const found = [];
+    patterns.forEach(pattern => {
+        for (const match of chunk.matchAll(pattern)) {
+            const term = match[0].toLowerCase();
+            if (term.length >= MIN_TERM_LENGTH && !job.seen.has(term)) {
+                job.seen.add(term);
+                found.push(term);
+            }
+        }
+    });
+
+    const done = job.offset >= job.text.length;
+    if (done) {
+        jobs.shift();
+    }
+    self.postMessage({ type: 'terms', id: job.id, terms: found, done: done });
+    setTimeout(scanNextChunk, 0);
+}
+
+// Cut chunks at a line break, or at least at whitespace, so terms are not split
+function nextChunk(text, offset) {
+    const end = offset + CHUNK_SIZE;
+    if (end >= text.length) {
+        return text.slice(offset);
+    }
+    let cut = text.lastIndexOf('\n', end);
+    if (cut <= offset) {
+        cut = text.lastIndexOf(' ', end);
+    }
+    return text.slice(offset, cut > offset ? cut + 1 : end);
+}
@@ -5,7 +5,7 @@ import io
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
-from app import extract_text_from_file, simplify_legal_text, explain_legal_term, generate_document_summary
+from app import extract_text_from_file, simplify_legal_text, explain_legal_term, generate_document_summary, client_pool, warm_up_llm_clients
 from config import get_config
 
 # Load environment variables
@@ -84,10 +84,15 @@ def get_llm():
         st.error("⚠️ OpenAI API key not found. Please set OPENAI_API_KEY in your environment variables.")
         return None
     
+    # Share the Flask app's connection pool rather than opening a second one
+    warm_up_llm_clients()
     return ChatOpenAI(
         model=config.OPENAI_MODEL,
         temperature=config.OPENAI_TEMPERATURE,
-        api_key=api_key
+        api_key=api_key,
+        base_url=config.OPENAI_API_BASE_URL,
+        http_client=client_pool.client,
+        timeout=client_pool.timeout
     )
 
 
@@ -80,7 +80,30 @@ class TestLegalDocumentAI(unittest.TestCase):
                 
                 # Clean up
                 os.unlink(temp_file.name)
-    
+
+    def test_text_extraction_pdf_stops_at_budget(self):
+        """Test PDF extraction only parses the pages the budget needs"""
+        with patch('PyPDF2.PdfReader') as mock_pdf:
+            mock_pages = [MagicMock() for _ in range(500)]
+            for number, mock_page in enumerate(mock_pages):
+                mock_page.extract_text.return_value = f"Page {number} " + "x" * 2000
+            mock_pdf.return_value.pages = mock_pages
+
+            from app import extract_text_from_pdf, ai_extraction_budget
+
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
+                temp_file.write(b"dummy pdf content")
+                temp_file.flush()
+
+                result = extract_text_from_pdf(temp_file.name, ai_extraction_budget())
+                self.assertEqual(len(result), ai_extraction_budget())
+                self.assertTrue(result.startswith("Page 0 "))
+                self.assertTrue(mock_pages[1].extract_text.called)
+                self.assertFalse(mock_pages[3].extract_text.called)
+
+                # Clean up
+                os.unlink(temp_file.name)
+
     def test_text_extraction_docx(self):
         """Test DOCX text extraction (mocked)"""
         with patch('docx.Document') as mock_docx:
@@ -115,7 +138,43 @@ class TestLegalDocumentAI(unittest.TestCase):
             
             # Clean up
             os.unlink(temp_file.name)
-    
+
+    def test_text_extraction_txt_encodings(self):
+        """Test TXT extraction of Windows-1252 and UTF-16 exports"""
+        from app import extract_text_from_txt, detect_text_encoding
+
+        for encoding, expected in [('cp1252', 'cp1252'), ('utf-16', 'utf-16')]:
+            with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as temp_file:
+                temp_file.write("The Licensee’s “Confidential” data – see § 4".encode(encoding))
+                temp_file.flush()
+
+                self.assertEqual(detect_text_encoding(temp_file.name), expected)
+                result = extract_text_from_txt(temp_file.name)
+                self.assertEqual(result, "The Licensee’s “Confidential” data – see § 4")
+
+                # Clean up
+                os.unlink(temp_file.name)
+
+    def test_text_extraction_txt_budget(self):
+        """Test TXT extraction normalizes whitespace and stops at the budget"""
+        from app import app, extract_text_from_file, extract_text_from_txt
+
+        with tempfile.NamedTemporaryFile(suffix='.txt', mode='w', delete=False) as temp_file:
+            temp_file.write("  WHEREAS   the\tparties \r\n agree,\n\n\n\nNOW THEREFORE  \n" + "x " * 50000)
+            temp_file.flush()
+
+            with patch.dict(app.config, {'TXT_READ_CHUNK_SIZE': 7}):
+                result = extract_text_from_txt(temp_file.name, max_chars=60)
+            self.assertLessEqual(len(result), 60)
+            self.assertTrue(result.startswith("WHEREAS the parties\nagree,\n\nNOW THEREFORE\nx x"))
+
+            result = extract_text_from_txt(temp_file.name, max_tokens=5)
+            self.assertEqual(result, "WHEREAS the parties")
+            self.assertEqual(extract_text_from_file(temp_file.name, 'txt', max_tokens=5), "WHEREAS the parties")
+
+            # Clean up
+            os.unlink(temp_file.name)
+
     def test_legal_term_extraction(self):
         """Test legal term extraction from JavaScript"""
         # This would test the JavaScript function extractLegalTerms
@@ -239,6 +298,593 @@ class TestLegalDocumentAI(unittest.TestCase):
 
                 os.unlink(temp_file_path)
 
+    def test_document_text_pages(self):
+        """Test uploaded text is served page by page from the document store"""
+        import gzip
+        import time
+        from app import app
+
+        with app.test_client() as client:
+            # The store keeps the whole document, not just the extraction budget
+            with patch('app.simplify_legal_text') as mock_simplify, \
+                 patch('app.generate_document_summary') as mock_summarize, \
+                 patch.dict(app.config, {'MAX_EXTRACT_CHARS': 1000}):
+
+                mock_simplify.return_value = "Simplified text"
+                mock_summarize.return_value = "Summary"
+
+                with tempfile.NamedTemporaryFile(suffix='.txt', mode='w', delete=False) as temp_file:
+                    temp_file.write("clause " * 5000)
+                    temp_file.flush()
+                    temp_file_path = temp_file.name
+
+                with open(temp_file_path, 'rb') as f:
+                    data = {'file': (f, 'long.txt')}
+                    response = client.post('/upload', data=data, content_type='multipart/form-data')
+
+                os.unlink(temp_file_path)
+
+            json_data = response.get_json()
+            self.assertNotIn('original_text', json_data)
+            self.assertLessEqual(len(mock_simplify.call_args[0][0]), app.config['MAX_TEXT_LENGTH'] + app.config['EXTRACTION_WINDOW'])
+            url = f"/documents/{json_data['document_id']}/text"
+
+            # Wait for the background extraction to finish
+            for _ in range(50):
+                page = client.get(url, query_string={'page': 1}).get_json()
+                if page['complete']:
+                    break
+                time.sleep(0.1)
+
+            self.assertEqual(page['page_count'], 2)
+            self.assertFalse(page['has_more'])
+            self.assertFalse(page['truncated'])
+            self.assertEqual(len(page['text']), 5000 * len("clause ") - 1 - app.config['ORIGINAL_TEXT_PAGE_SIZE'])
+
+            response = client.get(url, query_string={'start': 19995, 'end': 20010})
+            self.assertEqual(response.get_json()['text'], ("clause " * 5000)[19995:20010])
+
+            response = client.get(url, query_string={'page': 0}, headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertIn(b'"page_count":2', gzip.decompress(response.data).replace(b' ', b''))
+
+            response = client.get('/documents/0123456789abcdef0123456789abcdef/text')
+            self.assertEqual(response.status_code, 404)
+
+            # A document whose extraction fails is removed from the store
+            import io
+            from app import document_store
+            documents = set(os.listdir(document_store.folder))
+            response = client.post('/upload', data={'file': (io.BytesIO(b"not a pdf"), 'broken.pdf')},
+                                   content_type='multipart/form-data')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(set(os.listdir(document_store.folder)), documents)
+
+            # A document whose background extraction fails part way is served as failed, not complete
+            from app import finish_document
+
+            def failing_pages():
+                yield "Page one. "
+                yield "Page two. "
+                raise ValueError("Damaged page")
+
+            writer = document_store.create('damaged.pdf', app.config['MAX_EXTRACT_CHARS'])
+            finish_document(writer, failing_pages())
+            page = client.get(f"/documents/{writer.document_id}/text", query_string={'page': 0}).get_json()
+            self.assertEqual(page['text'], "Page one. Page two. ")
+            self.assertTrue(page['complete'])
+            self.assertTrue(page['failed'])
+            self.assertFalse(page['has_more'])
+
+            # A document purged while it is being drained is finished quietly
+            writer = document_store.create('purged.txt', app.config['MAX_EXTRACT_CHARS'])
+            document_store.discard(writer.document_id)
+            finish_document(writer, (text for text in ["Late text"]))
+
+    def test_model_router(self):
+        """Test routing by request size and failover between backends"""
+        from langchain.schema import HumanMessage
+        from model_router import Backend, ModelRouter
+
+        mock_response = MagicMock()
+        mock_response.content = "Mock AI response"
+        fast = Backend('cheap', 'fast', 'mini', MagicMock(), 10)
+        quality = Backend('primary', 'quality', 'large', MagicMock(), 10)
+        fast.client.invoke.return_value = mock_response
+        quality.client.invoke.return_value = mock_response
+        router = ModelRouter([quality, fast], short_prompt_chars=100, max_error_rate=0.4)
+
+        router.invoke([HumanMessage(content="force majeure")], task='explain')
+        router.invoke([HumanMessage(content="x" * 1000)], task='simplify')
+        self.assertEqual(fast.client.invoke.call_count, 1)
+        self.assertEqual(quality.client.invoke.call_count, 1)
+
+        # A failing backend is skipped over, then tried last once unhealthy
+        quality.client.invoke.side_effect = RuntimeError("upstream timeout")
+        self.assertIs(router.invoke([HumanMessage(content="x" * 1000)], task='simplify'), mock_response)
+        router.invoke([HumanMessage(content="x" * 1000)], task='simplify')
+        self.assertEqual(quality.client.invoke.call_count, 2)
+
+        metrics = router.metrics()
+        self.assertEqual(metrics['failovers'], 1)
+        self.assertEqual(metrics['decisions']['simplify'], {'primary': 1, 'cheap': 2})
+        self.assertEqual(metrics['backends']['primary']['errors'], 1)
+
+        fast.client.invoke.side_effect = RuntimeError("connection refused")
+        with self.assertRaises(RuntimeError):
+            router.invoke([HumanMessage(content="x")], task='explain')
+
+    def test_model_router_recovery(self):
+        """Test a backend that failed once gets its traffic back once the error ages out"""
+        import time
+        from langchain.schema import HumanMessage
+        from model_router import Backend, ModelRouter
+
+        mock_response = MagicMock()
+        fast = Backend('cheap', 'fast', 'mini', MagicMock(), 10, error_ttl=30)
+        quality = Backend('primary', 'quality', 'large', MagicMock(), 10, error_ttl=30)
+        fast.client.invoke.return_value = mock_response
+        quality.client.invoke.side_effect = [RuntimeError("upstream timeout")] + [mock_response] * 10
+        router = ModelRouter([quality, fast], short_prompt_chars=100, max_error_rate=0.5)
+        messages = [HumanMessage(content="x" * 1000)]
+
+        router.invoke(messages, task='simplify')
+        router.invoke(messages, task='simplify')
+        self.assertEqual(quality.client.invoke.call_count, 1)
+        self.assertEqual(fast.client.invoke.call_count, 2)
+
+        now = time.monotonic()
+        with patch('model_router.time.monotonic', return_value=now + 31):
+            self.assertEqual(quality.stats.error_rate(), 0.0)
+            for _ in range(5):
+                router.invoke(messages, task='simplify')
+        self.assertEqual(quality.client.invoke.call_count, 6)
+        self.assertEqual(fast.client.invoke.call_count, 2)
+        self.assertEqual(router.metrics()['decisions']['simplify'], {'cheap': 2, 'primary': 5})
+
+    def test_model_router_hedging(self):
+        """Test a slow call is hedged onto the spare backend within the budget"""
+        import time
+        from langchain.schema import HumanMessage
+        from model_router import Backend, ModelRouter
+
+        slow_response, fast_response = MagicMock(), MagicMock()
+        slow = Backend('primary', 'fast', 'large', MagicMock(), 10)
+        spare = Backend('spare', 'fast', 'mini', MagicMock(), 10)
+        slow.client.invoke.side_effect = lambda messages: time.sleep(0.5) or slow_response
+        spare.client.invoke.return_value = fast_response
+        router = ModelRouter([slow, spare], short_prompt_chars=100, max_error_rate=0.5,
+                             hedging=True, hedge_default_delay=0.05, hedge_max_ratio=0.5)
+
+        # Stats are empty, so both backends score equally and the primary goes first
+        self.assertIs(router.invoke([HumanMessage(content="waiver")], task='explain'), fast_response)
+        metrics = router.metrics()
+        self.assertEqual((metrics['hedges_fired'], metrics['hedges_won']), (1, 1))
+        self.assertEqual(metrics['decisions']['explain'], {'spare': 1})
+
+        # A second hedge would exceed half of all calls, so the slow call is awaited
+        router.backends = [slow]
+        self.assertIs(router.invoke([HumanMessage(content="waiver")], task='explain'), slow_response)
+        self.assertEqual(router.metrics()['hedges_fired'], 1)
+
+        # Long simplifications do not push out the hedge deadline for quick explanations
+        backend = Backend('shared', 'quality', 'large', MagicMock(), 10)
+        for _ in range(9):
+            backend.stats.record(8.0, ok=True, task='simplify')
+        backend.stats.record(0.4, ok=True, task='explain')
+        self.assertEqual(router.hedge_delay(backend, 'explain'), 0.4)
+        self.assertEqual(router.hedge_delay(backend, 'simplify'), 8.0)
+        self.assertEqual(router.hedge_delay(backend, 'summarize'), router.hedge_default_delay)
+
+    def test_production_server_preload(self):
+        """Test the production launcher preloads shared state and bounds workers"""
+        from app import app, config, preload, compile_legal_term_patterns
+        from serve import server_options
+
+        preload()
+        sensitive, insensitive = compile_legal_term_patterns()
+        self.assertIn("Effective Date", sensitive.findall(self.sample_legal_text))
+        self.assertIn("WHEREAS", insensitive.findall(self.sample_legal_text))
+
+        options = server_options(config)
+        self.assertTrue(options['preload_app'])
+        self.assertEqual(options['threads'], config.SERVER_THREADS)
+        self.assertEqual(options['max_requests'], config.SERVER_MAX_REQUESTS)
+
+    def test_admission_control(self):
+        """Test per-client limits shed load with 429 and feed /health"""
+        import multiprocessing
+        from admission import AdmissionController
+        from app import app, admission
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Two controllers on one file stand in for two server workers
+            path = os.path.join(temp_dir, 'admission.sqlite3')
+            controller = AdmissionController(path, max_concurrent=2, max_concurrent_per_client=2,
+                                             max_tokens=2000, max_tokens_per_client=600)
+            other_worker = AdmissionController(path, max_concurrent=2, max_concurrent_per_client=2,
+                                               max_tokens=2000, max_tokens_per_client=600)
+            first = controller.try_acquire('10.0.0.1', 500)
+            self.assertIsNotNone(first)
+            self.assertIsNone(other_worker.try_acquire('10.0.0.1', 200))
+            self.assertIsNotNone(other_worker.try_acquire('10.0.0.2', 5000))
+            self.assertFalse(controller.is_ready())
+            controller.release(first, 4.2)
+            self.assertTrue(other_worker.is_ready())
+            self.assertEqual(controller.retry_after(), 2)
+
+            # Tickets held by a worker that died mid-request are reclaimed
+            worker = multiprocessing.get_context('fork').Process(target=controller.try_acquire, args=('10.0.0.3', 100))
+            worker.start()
+            worker.join()
+            self.assertEqual(controller.snapshot()['in_flight'], 2)
+            self.assertIsNotNone(controller.try_acquire('10.0.0.1', 100))
+            self.assertEqual(controller.snapshot()['in_flight'], 2)
+
+        with app.test_client() as client:
+            with patch.object(admission, 'max_concurrent_per_client', 0):
+                response = client.post('/simplify', json={'text': self.sample_legal_text})
+                self.assertEqual(response.status_code, 429)
+                self.assertIn('Retry-After', response.headers)
+
+            with patch.object(admission, 'max_concurrent', 0):
+                response = client.get('/health')
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response.get_json()['status'], 'overloaded')
+
+            with patch.dict(app.config, {'MAX_CONTENT_LENGTH': 10}):
+                response = client.post('/simplify', json={'text': self.sample_legal_text})
+                self.assertEqual(response.status_code, 413)
+
+    def test_usage_ledger(self):
+        """Test LLM calls are recorded in the ledger and aggregated by route and model"""
+        from langchain.schema import HumanMessage
+        from langchain_core.messages import AIMessage
+        from ledger import UsageLedger, report
+        from model_router import Backend, ModelRouter
+        from app import app, usage_context
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ledger = UsageLedger(os.path.join(temp_dir, 'usage.sqlite3'), pricing={'gpt-4': [0.03, 0.06]}, flush_interval=0.1)
+            backend = Backend('primary', 'quality', 'gpt-4', MagicMock(), 10)
+            backend.client.invoke.return_value = AIMessage(
+                content="Mock AI response",
+                usage_metadata={'input_tokens': 1000, 'output_tokens': 500, 'total_tokens': 1500},
+                response_metadata={'model_name': 'gpt-4-0613'}
+            )
+            router = ModelRouter([backend], short_prompt_chars=100, max_error_rate=0.5,
+                                 ledger=ledger, usage_context=usage_context)
+
+            with app.test_request_context('/explain', method='POST'):
+                router.invoke([HumanMessage(content="waiver")], task='explain')
+                router.invoke([HumanMessage(content="estoppel")], task='explain')
+            backend.client.invoke.side_effect = RuntimeError("upstream timeout")
+            with app.test_request_context('/simplify', method='POST'):
+                with self.assertRaises(RuntimeError):
+                    router.invoke([HumanMessage(content="x" * 1000)], task='simplify')
+            ledger.flush()
+
+            rows = report(ledger.path, ['route', 'model'])
+            self.assertEqual([row['route'] for row in rows], ['/explain', '/simplify'])
+            self.assertEqual(rows[0]['calls'], 2)
+            self.assertEqual(rows[0]['prompt_tokens'], 2000)
+            self.assertAlmostEqual(rows[0]['cost'], 0.12)
+            self.assertEqual((rows[1]['errors'], rows[1]['cost']), (1, 0.0))
+            self.assertEqual(report(ledger.path, ['response_model'])[-1]['response_model'], 'gpt-4-0613')
+            self.assertEqual(ledger.prices('gpt-4-0613'), [0.03, 0.06])
+            self.assertEqual(ledger.prices('llama3'), (0.0, 0.0))
+            self.assertEqual(report(ledger.path, ['client'])[0]['calls'], 3)
+
+        # Entries still queued when a process exits are written before it goes
+        import subprocess
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'usage.sqlite3')
+            subprocess.run([sys.executable, '-c', "from app import usage_ledger; usage_ledger.record(None, 0.1, model='gpt-4')"],
+                           env={**os.environ, 'USAGE_LEDGER_PATH': path, 'ADMISSION_STATE_PATH': os.path.join(temp_dir, 'admission.sqlite3')},
+                           cwd=os.path.dirname(os.path.abspath(__file__)), check=True, capture_output=True)
+            self.assertEqual(report(path, ['model'])[0]['calls'], 1)
+
+        # Client addresses are not exposed over HTTP
+        with app.test_client() as client:
+            self.assertEqual(client.get('/reports/usage', query_string={'group_by': 'route,client'}).status_code, 400)
+
+        # An unwritable ledger drops and counts entries instead of killing the writer or blocking flush()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ledger = UsageLedger(os.path.join(temp_dir, 'missing', 'usage.sqlite3'), pricing={}, flush_interval=0.05)
+            ledger.record(None, 0.1, model='gpt-4')
+            self.assertTrue(ledger.flush(timeout=5))
+            self.assertEqual(ledger.dropped, 1)
+            os.makedirs(os.path.join(temp_dir, 'missing'))
+            ledger.record(None, 0.1, model='gpt-4')
+            self.assertTrue(ledger.flush(timeout=5))
+            self.assertEqual(ledger.dropped, 1)
+            self.assertEqual(report(ledger.path, ['model'])[0]['calls'], 1)
+
+    def test_term_patterns_route(self):
+        """Test the combined term patterns served to the detection worker"""
+        import re
+        from app import app
+
+        with app.test_client() as client:
+            response = client.get('/term-patterns')
+
+        patterns = response.get_json()['patterns']
+        self.assertEqual([pattern['flags'] for pattern in patterns], ['g', 'gi'])
+        self.assertIn('max-age=3600', response.headers['Cache-Control'])
+
+        insensitive = re.compile(patterns[1]['source'], re.IGNORECASE)
+        self.assertIn("WHEREAS", insensitive.findall(self.sample_legal_text))
+        for pattern in app.config['LEGAL_TERM_PATTERNS']:
+            self.assertTrue(any(pattern in combined['source'] for combined in patterns))
+
+        # A failed explanation is an error response, so the client's cache never keeps it
+        with app.test_client() as client, patch('app.llm') as mock_llm:
+            mock_llm.invoke.side_effect = RuntimeError("upstream timeout")
+            response = client.post('/explain', json={'term': 'estoppel'})
+            self.assertEqual(response.status_code, 502)
+            self.assertFalse(response.get_json().get('success', False))
+            self.assertIn('upstream timeout', response.get_json()['error'])
+
+            mock_llm.invoke.side_effect = None
+            mock_llm.invoke.return_value = MagicMock(content="A bar on going back on your word")
+            response = client.post('/explain', json={'term': 'estoppel'})
+            self.assertEqual(response.get_json(), {'success': True, 'explanation': "A bar on going back on your word"})
+
+    def test_upload_batch(self):
+        """Test several files are extracted through the registry and streamed back one result per line"""
+        import io
+        import json
+        from app import app, admission, EXTRACTORS, extract_text_from_file
+
+        self.assertTrue(EXTRACTORS['pdf']['page_parallel'])
+        self.assertFalse(EXTRACTORS['txt']['buffer_input'])
+        with self.assertRaises(ValueError):
+            extract_text_from_file('contract.rtf', 'rtf')
+
+        with app.test_client() as client:
+            with patch('app.simplify_legal_text') as mock_simplify, \
+                 patch('app.generate_document_summary') as mock_summarize, \
+                 patch('docx.Document') as mock_docx:
+
+                mock_simplify.side_effect = lambda text: f"Simplified: {text}"
+                mock_summarize.return_value = "Summary"
+                mock_docx.return_value.paragraphs = [MagicMock(text=self.sample_legal_text)]
+
+                data = {'files': [
+                    (io.BytesIO(b"The lessee shall pay rent."), 'lease.txt'),
+                    (io.BytesIO(b"docx bytes"), 'contract.docx'),
+                    (io.BytesIO(b"binary"), 'image.png'),
+                ]}
+                response = client.post('/upload/batch', data=data, content_type='multipart/form-data')
+                self.assertEqual(response.mimetype, 'application/x-ndjson')
+                results = {result['filename']: result for result in map(json.loads, response.get_data(as_text=True).splitlines())}
+                response.close()
+
+            self.assertEqual(len(results), 3)
+            self.assertEqual(results['lease.txt']['simplified_text'], "Simplified: The lessee shall pay rent.")
+            self.assertEqual(results['contract.docx']['summary'], "Summary")
+            self.assertIn('document_id', results['contract.docx'])
+            self.assertFalse(results['image.png']['success'])
+            # The docx was read from memory rather than saved to the upload folder
+            self.assertIsInstance(mock_docx.call_args[0][0], io.BytesIO)
+            self.assertEqual(admission.snapshot()['in_flight'], 0)
+
+            # Non-ASCII names keep their extension once made safe, so the rest of the batch is unaffected
+            with patch('app.simplify_legal_text', return_value="Simplified"), \
+                 patch('app.generate_document_summary', return_value="Summary"):
+                data = {'files': [
+                    (io.BytesIO(b"The lessee shall pay rent."), 'a.txt'),
+                    (io.BytesIO(b"The lessor shall repair."), '契約.txt'),
+                ]}
+                response = client.post('/upload/batch', data=data, content_type='multipart/form-data')
+                self.assertEqual(response.status_code, 200)
+                results = {result['filename']: result for result in map(json.loads, response.get_data(as_text=True).splitlines())}
+                response.close()
+            self.assertTrue(results['a.txt']['success'])
+            self.assertTrue(results['document.txt']['success'])
+
+            response = client.post('/upload/batch', data={}, content_type='multipart/form-data')
+            self.assertEqual(response.status_code, 400)
+
+            # A stuck AI stage is reported as timed out and the admission ticket is still released
+            import time
+            with patch('app.simplify_legal_text', side_effect=lambda text: time.sleep(1) or "Late"), \
+                 patch('app.generate_document_summary', return_value="Summary"), \
+                 patch.dict(app.config, {'BATCH_TIMEOUT': 0.2}):
+                data = {'files': [(io.BytesIO(b"The lessee shall pay rent."), 'slow.txt')]}
+                response = client.post('/upload/batch', data=data, content_type='multipart/form-data')
+                lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+                response.close()
+            self.assertEqual(lines, [{'success': False, 'error': 'Timed out processing file', 'filename': 'slow.txt'}])
+            self.assertEqual(admission.snapshot()['in_flight'], 0)
+
+    def test_llm_client_pool(self):
+        """Test the warmup opens reusable connections that chat models then share"""
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from langchain.schema import HumanMessage
+        from llm_clients import ClientPool
+        from model_router import build_chat_model
+
+        connections = []
+
+        class StubHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                connections.append(self.client_address)
+
+            def do_GET(self):
+                self.reply({'object': 'list', 'data': [{'id': 'stub-model', 'object': 'model'}]})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                self.reply({
+                    'id': 'chatcmpl-1', 'object': 'chat.completion', 'created': 0, 'model': 'stub-model',
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': 'Plain English'}, 'finish_reason': 'stop'}],
+                    'usage': {'prompt_tokens': 5, 'completion_tokens': 2, 'total_tokens': 7}
+                })
+
+            def reply(self, body):
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            spec = {'name': 'stub', 'model': 'stub-model', 'api_key': 'test',
+                    'base_url': f'http://127.0.0.1:{server.server_address[1]}/v1'}
+            pool = ClientPool(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60,
+                              connect_timeout=5, timeout=10, warmup_connections=2)
+            results = pool.warmup([spec, {**spec, 'name': 'stub-fast'}])
+            self.assertEqual(list(results), [spec['base_url']])
+            self.assertTrue(results[spec['base_url']]['ok'])
+            self.assertEqual(len(connections), 2)
+
+            timeouts = []
+            pool.client.event_hooks['request'].append(lambda request: timeouts.append(request.extensions['timeout']))
+            model = build_chat_model(spec, 0.3, pool.client, pool.timeout)
+            for _ in range(3):
+                self.assertEqual(model.invoke([HumanMessage(content="Hello")]).content, "Plain English")
+            # The configured timeouts reach every request rather than being replaced by None
+            self.assertEqual(timeouts[-1], {'connect': 5, 'read': 10, 'write': 10, 'pool': 10})
+            # Every call reused a warmed-up connection
+            self.assertEqual(len(connections), 2)
+            self.assertEqual(pool.snapshot()['warmup']['pid'], os.getpid())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_traffic_recording_and_replay(self):
+        """Test recorded requests can be replayed and summarized with per-process resource usage"""
+        import threading
+        from werkzeug.serving import make_server
+        from traffic import TrafficRecorder, load_traffic
+        from replay import REPLAY_ROUTES, ProcessSampler, build_request, replay, schedule, summarize
+        from app import app
+
+        with tempfile.TemporaryDirectory() as temp_dir, \
+             patch('app.simplify_legal_text', return_value="Simplified text"), \
+             patch('app.generate_document_summary', return_value="Summary"):
+            path = os.path.join(temp_dir, 'traffic.jsonl')
+            with patch.object(app, 'wsgi_app', TrafficRecorder(app.wsgi_app, path)):
+                with app.test_client() as client:
+                    # Entries are written when the server closes the response
+                    client.post('/simplify', json={'text': self.sample_legal_text}).close()
+                    client.get('/health').close()
+                    client.post('/upload', data={'file': (self.build_text_pdf(4), 'lease.pdf')},
+                                content_type='multipart/form-data').close()
+
+            self.assertEqual(len(load_traffic(path)), 3)
+            entries = load_traffic(path, REPLAY_ROUTES)
+            self.assertEqual(len(entries), 2)
+
+            # Uploads are replayed as the recorded file type at about the recorded size
+            upload = entries.pop()
+            self.assertEqual(upload['upload_types'], ['pdf'])
+            method, route, arguments = build_request(upload)
+            filename, content, content_type = arguments['files']['file']
+            self.assertEqual((method, route, filename, content_type), ('POST', '/upload', 'replay.pdf', 'application/pdf'))
+            self.assertTrue(content.startswith(b'%PDF'))
+            self.assertLess(abs(len(content) - upload['request_bytes']), upload['request_bytes'] * 0.2)
+
+            self.assertEqual(entries[0]['status'], 200)
+            self.assertGreater(entries[0]['request_bytes'], len(self.sample_legal_text))
+            self.assertGreater(entries[0]['response_bytes'], 0)
+            self.assertEqual([offset for offset, _ in schedule(entries * 3, rate=10)], [0.0, 0.1, 0.2])
+
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            sampler = ProcessSampler(os.getpid(), interval=0.05).start()
+            try:
+                results = replay(entries * 3, f'http://127.0.0.1:{server.server_port}', rate=50, concurrency=3)
+            finally:
+                processes = sampler.stop()
+                server.shutdown()
+
+        summary = summarize(results, 1.0)
+        self.assertEqual(summary['routes']['/simplify']['requests'], 3)
+        self.assertEqual(summary['error_rate'], 0.0)
+        self.assertEqual(summary['throughput'], 3.0)
+        self.assertGreater(processes[os.getpid()]['peak_rss_mb'], 0)
+
+    def build_text_pdf(self, pages, lines_per_page=25):
+        """Build a PDF whose pages carry real text content streams"""
+        import io
+        from PyPDF2 import PdfWriter, PageObject
+        from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+        writer = PdfWriter()
+        font = writer._add_object(DictionaryObject({
+            NameObject('/Type'): NameObject('/Font'),
+            NameObject('/Subtype'): NameObject('/Type1'),
+            NameObject('/BaseFont'): NameObject('/Helvetica'),
+        }))
+        for number in range(pages):
+            page = PageObject.create_blank_page(width=612, height=792)
+            content = DecodedStreamObject()
+            content.set_data(''.join(
+                f"BT /F1 10 Tf 40 {760 - 18 * line} Td (Page {number} line {line}: The Lessee shall indemnify the Lessor.) Tj ET\n"
+                for line in range(lines_per_page)
+            ).encode())
+            page[NameObject('/Contents')] = writer._add_object(content)
+            page[NameObject('/Resources')] = DictionaryObject({
+                NameObject('/Font'): DictionaryObject({NameObject('/F1'): font})
+            })
+            writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        buffer.seek(0)
+        return buffer
+
+    def test_upload_memory_budget(self):
+        """Test a 100-page PDF upload stays within its per-stage memory targets"""
+        import io
+        import time
+        import docx
+        from app import app, upload_profiler, iter_document_text
+
+        pdf = self.build_text_pdf(100)
+        with app.test_client() as client, \
+             patch.object(upload_profiler, 'enabled', True), \
+             patch('app.simplify_legal_text', return_value="Simplified text"), \
+             patch('app.generate_document_summary', return_value="Summary"):
+            upload_profiler.reset()
+            response = client.post('/upload', data={'file': (pdf, 'lease.pdf')}, content_type='multipart/form-data')
+            url = f"/documents/{response.get_json()['document_id']}/text"
+            for _ in range(100):
+                page = client.get(url, query_string={'page': 0}).get_json()
+                if page['complete']:
+                    break
+                time.sleep(0.1)
+
+        self.assertTrue(page['complete'])
+        self.assertIn("Page 99 line 24", client.get(url, query_string={'page': page['page_count'] - 1}).get_json()['text'])
+        stages = upload_profiler.report()['stages']
+        self.assertEqual(set(stages), {'save', 'extract', 'store', 'simplify', 'summarize'})
+        # Parsing the page tree dominates the prefix; draining the other pages must not keep them all
+        self.assertLess(stages['extract']['max_peak'], 1024 * 1024)
+        self.assertLess(stages['store']['max_peak'], 256 * 1024)
+        upload_profiler.reset()
+
+        document = docx.Document()
+        document.add_paragraph(self.sample_legal_text)
+        buffer = io.BytesIO()
+        document.save(buffer)
+        with patch.dict(app.config, {'UPLOAD_MEMORY_BUDGET': 1024}):
+            with self.assertRaises(ValueError):
+                next(iter_document_text(io.BytesIO(buffer.getvalue()), 'docx'))
+        self.assertIn("Effective Date", next(iter_document_text(io.BytesIO(buffer.getvalue()), 'docx')))
+
 def run_tests():
     """Run all tests"""
     print("🧪 Running Legal Document AI Tests...")
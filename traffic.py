@@ -0,0 +1,94 @@
+"""
+Traffic recording for Legal Document AI Simplifier
+WSGI middleware that appends one JSON line per request with its route,
+payload sizes, status and timing. Request bodies are never stored; replay.py
+regenerates payloads of the recorded sizes and upload file types.
+"""
+
+import os
+import json
+import time
+import threading
+
+# Views append each uploaded file's extension here; the environ is shared with the recorder
+UPLOAD_TYPES_KEY = 'traffic.upload_types'
+
+
+class RecordedBody:
+    """Response iterable that counts the bytes sent and reports once the server closes it"""
+
+    def __init__(self, body, on_close):
+        self.body = body
+        self.on_close = on_close
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.on_close(self.size)
+
+
+class TrafficRecorder:
+    """Wraps a WSGI app and records every request to a JSONL file"""
+
+    def __init__(self, app, path):
+        self.app = app
+        self.path = path
+        self.lock = threading.Lock()
+        self._fd = None
+        self._fd_pid = None
+
+    def __call__(self, environ, start_response):
+        started = time.time()
+        start = time.monotonic()
+        entry = {
+            'ts': round(started, 6),
+            'method': environ.get('REQUEST_METHOD'),
+            'route': environ.get('PATH_INFO'),
+            'content_type': environ.get('CONTENT_TYPE') or None,
+            'request_bytes': int(environ.get('CONTENT_LENGTH') or 0),
+            'pid': os.getpid(),
+        }
+
+        def recording_start_response(status, headers, exc_info=None):
+            entry['status'] = int(status.split(' ', 1)[0])
+            return start_response(status, headers, exc_info)
+
+        def finish(size):
+            if environ.get(UPLOAD_TYPES_KEY):
+                entry['upload_types'] = environ[UPLOAD_TYPES_KEY]
+            entry['response_bytes'] = size
+            entry['duration'] = round(time.monotonic() - start, 6)
+            self.write(entry)
+
+        return RecordedBody(self.app(environ, recording_start_response), finish)
+
+    def write(self, entry):
+        """Append one line with a single write, so lines from several workers never interleave"""
+        line = (json.dumps(entry) + '\n').encode()
+        with self.lock:
+            if self._fd_pid != os.getpid():
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._fd_pid = os.getpid()
+            os.write(self._fd, line)
+
+
+def load_traffic(path, routes=None):
+    """Recorded requests in arrival order, optionally only those for the given routes"""
+    entries = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if routes is None or entry.get('route') in routes:
+                entries.append(entry)
+    entries.sort(key=lambda entry: entry['ts'])
+    return entries